@@ -7,9 +7,9 @@ from quectel.l76 import l76
 
 streams.serial()
 try:
-    gnss = l76.L76(SERIAL4)
+    gnss = l76.L76(SERIAL4,reset=D59)
     print("Starting...")
-    gnss.start(D59)
+    gnss.start()
     gnss.set_rate(1000)
     while True:
         #print(".")
@@ -0,0 +1,304 @@
+"""
+Asyncio interface to the L76 driver for CPython hosts (for example a gateway reading receivers through USB-serial bridges).
+
+No receiver thread is started: a task of the event loop reads the link and hands the bytes to :meth:`L76.feed`,
+so fixes are decoded by the same parser used on the device, and PMTK acknowledges are awaited instead of waited for.
+One event loop can service many receivers::
+
+    import asyncio
+    import aio
+
+    async def track(url):
+        gnss = await aio.open_serial(url,baud=9600,nmea="../lib-quectel-nmea")
+        await gnss.start()
+        await gnss.set_rate(1000)
+        async for fix in gnss:
+            print(url,fix)
+
+    async def main():
+        await asyncio.gather(track("/dev/ttyUSB0"),track("/dev/ttyUSB1"))
+
+    asyncio.run(main())
+
+:func:`connect` takes any ``asyncio`` reader/writer pair (TCP serial servers, pipes...); :func:`open_serial` needs ``pyserial-asyncio``.
+
+    """
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import zerynth
+
+# bytes requested per read of the link
+READ_SIZE = 256
+# seconds without new bytes that end the discard of stale input, and bytes discarded at most
+DISCARD_WAIT = 0.02
+DISCARD_MAX = 4096
+
+
+class StreamTransport():
+    """L76 transport writing to an ``asyncio.StreamWriter``; reads are done by :class:`AsyncL76`."""
+
+    baud = None
+    duplex = True
+
+    def __init__(self,writer,loop):
+        self.writer = writer
+        self.loop = loop
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self,data):
+        data = bytes(data)
+        try:
+            running = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            running = False
+        if running:
+            self.writer.write(data)
+        else:
+            # from the thread building the L76
+            self.loop.call_soon_threadsafe(self.writer.write,data)
+        return len(data)
+
+    def readinto(self,buf):
+        raise UnsupportedError
+
+    def available(self):
+        return 0
+
+    def set_baud(self,baud):
+        raise UnsupportedError
+
+
+class AsyncL76():
+    """
+    Coroutine interface to an L76 instance *gnss* whose output is read from the ``asyncio.StreamReader`` *reader*.
+
+    :meth:`fix`, :meth:`has_fix`, :meth:`utc` and the other read-only methods of *gnss* are available unchanged
+    through the :attr:`gnss` attribute; commands are coroutines here. Iterating with ``async for`` yields the fixes
+    as they are received, until :meth:`stop` or the end of the link.
+    """
+
+    def __init__(self,gnss,reader,l76):
+        self.gnss = gnss
+        self.reader = reader
+        self._l76 = l76
+        self._task = None
+        self._alive = asyncio.Event()
+        self._waiters = []
+        gnss.subscribe(on_fix=self._on_fix)
+
+    def fix(self):
+        return self.gnss.fix()
+
+    def has_fix(self):
+        return self.gnss.has_fix()
+
+    def utc(self):
+        return self.gnss.utc()
+
+    async def start(self,mode=None):
+        """Start the L76 (see ``L76.start``, *mode* defaults to ``AUTO_START``) and the reader task; returns *False* if already running."""
+        g = self.gnss
+        l76 = self._l76
+        if g.running:
+            return False
+        # L76._flush cannot see what the reader holds: output and acknowledges from before the start
+        await self._discard()
+        mode,reset = g._start_begin(l76.AUTO_START if mode is None else mode)
+        self._alive.clear()
+        loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._read())
+        if reset:
+            await loop.run_in_executor(None,g._reset_pulse)
+            await self._wait_alive(l76.BOOT_TIME)
+        else:
+            await self._wait_alive(l76.WAKEUP_TIME)
+        await self._restore(g._restore_commands(True,mode<=l76.WARM_START))
+        return True
+
+    async def stop(self):
+        """Put the L76 in standby and end the reader task; pending :meth:`next_fix` calls return *None*."""
+        g = self.gnss
+        if not g.running:
+            return False
+        g._stop_begin()
+        try:
+            await self._wake_send(161,(0,))
+        except Exception:
+            g._stop_end(False)
+            raise
+        g._stop_end(True)
+        self._wake(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # output still on the wire after the acknowledge
+        await self._discard()
+        return True
+
+    async def pause(self):
+        g = self.gnss
+        if not g.running:
+            raise RuntimeError
+        g._save_hint()
+        await self._wake_send(161,(0,))
+        g._pause_end()
+
+    async def resume(self):
+        g = self.gnss
+        if not g.running:
+            raise RuntimeError
+        g._resume_begin()
+        self._alive.clear()
+        await self._wait_alive(self._l76.WAKEUP_TIME)
+        await self._restore(g._restore_commands(False,True))
+
+    async def set_rate(self,rate=1000):
+        if not self.gnss.running:
+            raise RuntimeError
+        await self._wake_send(220,(rate,))
+
+    async def inject(self,position=None,utc=None,timeout=None):
+        cmd = self.gnss._inject_command(position,utc,self.gnss.fixed_point)
+        await self.send(cmd[0],cmd[1],timeout)
+
+    async def send(self,num,args=(),timeout=None):
+        """Send PMTK command *num* and await its acknowledge, raising as ``L76.send``; *timeout* in milliseconds."""
+        g = self.gnss
+        if not g.running:
+            raise RuntimeError
+        if timeout is None:
+            timeout = self._l76.ACK_TIMEOUT
+        pending = g._command(num,args,asyncio.Event())
+        try:
+            await asyncio.wait_for(pending[0].wait(),timeout/1000)
+        except asyncio.TimeoutError:
+            pass
+        g._acked(num,args,pending)
+
+    async def next_fix(self,timeout=None):
+        """Wait for the next fix (same tuple as ``L76.fix``); *None* if the receiver stops first. *timeout* in seconds."""
+        if not self.gnss.running:
+            return None
+        f = asyncio.get_running_loop().create_future()
+        self._waiters.append(f)
+        if timeout is None:
+            return await f
+        return await asyncio.wait_for(f,timeout)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        fix = await self.next_fix()
+        if fix is None:
+            raise StopAsyncIteration
+        return fix
+
+    ##################### Private
+
+    async def _read(self):
+        g = self.gnss
+        try:
+            while g.running:
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    break
+                try:
+                    woke = g.feed(data)
+                except Exception as e:
+                    g._loop_error(e)
+                    continue
+                if woke and not self._alive.is_set():
+                    self._alive.set()
+        finally:
+            if g._link_lost():
+                # end of the link
+                self._wake(None)
+
+    async def _discard(self):
+        # read until the link stays idle for DISCARD_WAIT seconds
+        total = 0
+        while total<DISCARD_MAX:
+            try:
+                data = await asyncio.wait_for(self.reader.read(READ_SIZE),DISCARD_WAIT)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+            total+=len(data)
+
+    async def _wait_alive(self,timeout):
+        try:
+            await asyncio.wait_for(self._alive.wait(),timeout/1000)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _wake_send(self,num,args=(),timeout=None):
+        # as L76._wake_send: repeated once if a low power L76 is silent
+        g = self.gnss
+        if timeout is None:
+            timeout = self._l76.ACK_TIMEOUT
+        first,retry = g._wake_timeouts(timeout)
+        try:
+            await self.send(num,args,first)
+            return
+        except TimeoutError:
+            if retry is None:
+                raise
+        await self.send(num,args,retry)
+
+    async def _restore(self,cmds):
+        # commands of L76._restore_commands: failures are logged, as in L76.start/resume
+        for cmd in cmds:
+            try:
+                await self.send(cmd[0],cmd[1])
+            except Exception as e:
+                self.gnss.print_d("L76 "+cmd[2],e)
+
+    def _on_fix(self,fix):
+        self._wake(fix)
+
+    def _wake(self,fix):
+        waiters = self._waiters
+        self._waiters = []
+        for f in waiters:
+            if not f.done():
+                f.set_result(fix)
+
+
+async def connect(reader,writer,nmea=None,**kwargs):
+    """
+    Create an :class:`AsyncL76` on an ``asyncio`` *reader*/*writer* pair.
+
+    *nmea* is the ``lib-quectel-nmea`` checkout (see ``zerynth.load_driver``), *kwargs* are passed to ``L76``
+    (for example *sentences*, *history*, *fixed_point*). The L76 boot wait runs in an executor.
+    """
+    l76 = zerynth.load_driver(nmea)
+    loop = asyncio.get_running_loop()
+    transport = StreamTransport(writer,loop)
+    gnss = await loop.run_in_executor(None,lambda: l76.L76(None,transport=transport,**kwargs))
+    return AsyncL76(gnss,reader,l76)
+
+
+async def open_serial(url,baud=9600,nmea=None,**kwargs):
+    """Open serial port *url* at *baud* with ``pyserial-asyncio`` and :func:`connect` to it."""
+    try:
+        import serial_asyncio
+    except ImportError:
+        raise ImportError("open_serial needs pyserial-asyncio (pip install pyserial-asyncio)")
+    reader,writer = await serial_asyncio.open_serial_connection(url=url,baudrate=baud)
+    return await connect(reader,writer,nmea,**kwargs)
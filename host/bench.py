@@ -0,0 +1,204 @@
+"""
+Throughput benchmark of the L76 receive path (framing, filtering, checksum, decoding) on the host.
+
+    python host/bench.py --nmea ../lib-quectel-nmea [--log host/logs/l76_1hz.nmea] [--save out.json] [--compare out.json]
+
+For each scenario (1, 5 and 10 Hz, with and without GSV bursts) the recorded log is retimed to the fix rate
+and fed back to back through ``L76._receive`` from a ``transport.MemoryTransport`` that returns at most ``--chunk`` bytes
+per read. Reported per scenario:
+
+    * sentences/s the receive loop sustains and the share of it needed at that fix rate
+    * transient bytes allocated per sentence (tracemalloc peak per read) and blocks retained after the run
+    * per-sentence latency percentiles, from the read that completed the sentence to the end of its processing
+
+With ``--compare``, scenarios whose throughput dropped more than ``--tolerance`` percent from a saved run
+are reported and the exit code is 1.
+
+    """
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import simulator
+import zerynth
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),"logs","l76_1hz.nmea")
+
+
+def bench_port(tr,data,chunk):
+    """``transport.MemoryTransport`` serving *data* in chunks of at most *chunk* bytes, recording the time of each read."""
+    port = tr.MemoryTransport(data,chunk)
+    port.read_time = 0
+    read = port.readinto
+
+    def readinto(buf):
+        n = read(buf)
+        port.read_time = time.perf_counter()
+        return n
+    port.readinto = readinto
+    return port
+
+
+def done(port):
+    return port.pos>=len(port.data)
+
+
+def retime(epochs,hz):
+    """Rewrite the time of day of RMC/GGA/GLL so that consecutive epochs are 1/hz seconds apart."""
+    step = 1000//hz
+    out = []
+    for n,epoch in enumerate(epochs):
+        ms = (9*3600+27*60+50)*1000+n*step
+        stamp = b"%02d%02d%02d.%03d" % (ms//3600000,ms//60000%60,ms//1000%60,ms%1000)
+        lines = []
+        for line in epoch:
+            body = line[1:line.index(b"*")]
+            fields = body.split(b",")
+            kind = fields[0][2:]
+            if kind in (b"RMC",b"GGA"):
+                fields[1] = stamp
+            elif kind==b"GLL":
+                fields[5] = stamp
+            lines.append(simulator.sentence(b",".join(fields)))
+        out.append(lines)
+    return out
+
+
+def stream(epochs,hz,gsv,seconds):
+    epochs = retime([e for e in epochs],hz)
+    data = bytearray()
+    count = 0
+    for n in range(int(hz*seconds)):
+        for line in epochs[n%len(epochs)]:
+            if not gsv and line[3:6]==b"GSV":
+                continue
+            data.extend(line)
+            count+=1
+    return bytes(data),count
+
+
+def drain(gnss,port):
+    gnss.transport = port
+    gnss._rxlen = 0
+    while not done(port):
+        gnss._receive()
+
+
+def measure(gnss,tr,data,count,seconds,chunk):
+    # throughput
+    port = bench_port(tr,data,chunk)
+    t0 = time.perf_counter()
+    drain(gnss,port)
+    elapsed = time.perf_counter()-t0
+    rate = count/elapsed
+
+    # latency, with the sentence handler wrapped
+    latencies = []
+    handler = gnss._sentence
+    port = bench_port(tr,data,chunk)
+
+    def timed(start,stop):
+        handler(start,stop)
+        latencies.append(time.perf_counter()-port.read_time)
+    gnss._sentence = timed
+    try:
+        drain(gnss,port)
+    finally:
+        del gnss._sentence
+    latencies.sort()
+
+    # allocations
+    port = bench_port(tr,data,chunk)
+    gnss.transport = port
+    gnss._rxlen = 0
+    transient = 0
+    tracemalloc.start()
+    try:
+        base = tracemalloc.take_snapshot()
+        while not done(port):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            gnss._receive()
+            transient+=tracemalloc.get_traced_memory()[1]-current
+        retained = sum(s.count_diff for s in tracemalloc.take_snapshot().compare_to(base,"filename") if s.count_diff>0)
+    finally:
+        tracemalloc.stop()
+
+    def pct(p):
+        return latencies[min(len(latencies)-1,int(p*len(latencies)/100))]*1e6
+
+    return {
+        "sentences": count,
+        "sentences_per_s": rate,
+        "load_pct": 100*(count/seconds)/rate,
+        "alloc_bytes_per_sentence": transient/count,
+        "retained_blocks": retained,
+        "latency_us": {"p50": pct(50),"p90": pct(90),"p99": pct(99),"max": latencies[-1]*1e6},
+    }
+
+
+def run(args):
+    l76 = zerynth.load_driver(args.nmea)
+    tr = l76.tr
+    # no boot waits on the host
+    l76.sleep = lambda ms: None
+    gnss = l76.L76(None,sentences=args.sentences,transport=tr.MemoryTransport())
+    gnss.running = True
+    gnss.talking = True
+
+    epochs = simulator.load_epochs(args.log)
+    results = {}
+    print("%-12s %10s %8s %10s %8s %9s %9s %9s" % (
+        "scenario","sent/s","load%","B/sent","retain","p50 us","p99 us","max us"))
+    for hz in (1,5,10):
+        for gsv in (True,False):
+            name = "%dHz%s" % (hz,"+GSV" if gsv else "")
+            data,count = stream(epochs,hz,gsv,args.seconds)
+            res = measure(gnss,tr,data,count,args.seconds,args.chunk)
+            results[name] = res
+            lat = res["latency_us"]
+            print("%-12s %10.0f %8.3f %10.1f %8d %9.1f %9.1f %9.1f" % (
+                name,res["sentences_per_s"],res["load_pct"],res["alloc_bytes_per_sentence"],
+                res["retained_blocks"],lat["p50"],lat["p99"],lat["max"]))
+
+    if args.save:
+        with open(args.save,"w") as f:
+            json.dump(results,f,indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        for name,res in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]["sentences_per_s"]
+            drop = 100*(before-res["sentences_per_s"])/before
+            if drop>args.tolerance:
+                print("REGRESSION %s: %.0f -> %.0f sentences/s (-%.1f%%)" % (name,before,res["sentences_per_s"],drop))
+                failed = True
+        return 1 if failed else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nmea",help="lib-quectel-nmea checkout (default: $L76_NMEA_PATH)")
+    parser.add_argument("--log",default=DEFAULT_LOG,help="NMEA log to replay")
+    parser.add_argument("--seconds",type=float,default=60,help="seconds of data per scenario")
+    parser.add_argument("--chunk",type=int,default=64,help="max bytes returned by a read")
+    parser.add_argument("--sentences",type=lambda s: tuple(s.split(",")),default=None,
+        help="sentence filter passed to L76, e.g. RMC,GGA,GSA")
+    parser.add_argument("--save",help="write results as JSON")
+    parser.add_argument("--compare",help="JSON results of a previous run")
+    parser.add_argument("--tolerance",type=float,default=10,help="allowed throughput drop in percent")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Run the L76 driver on the host against a :class:`simulator.SimulatedL76` replaying an NMEA log.
+
+    python host/replay.py --nmea ../lib-quectel-nmea host/logs/l76_1hz.nmea --rate 100 --baud 115200
+
+Reports start and command latencies, received fixes and the delay between the start of each epoch
+on the wire and the corresponding fix callback.
+
+    """
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import simulator
+import zerynth
+
+
+def percentile(values,p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values)-1,int(p*len(values)/100))]
+
+
+def run(args):
+    l76 = zerynth.load_driver(args.nmea)
+    chip = simulator.SimulatedL76(simulator.load_epochs(args.log),baud=args.power_on_baud)
+    zerynth.attach(zerynth.SERIAL1,chip)
+
+    gnss = l76.L76(zerynth.SERIAL1,baud=args.power_on_baud,sentences=args.sentences)
+    delays = []
+
+    def on_fix(fix):
+        if chip.epoch_starts:
+            delays.append((time.monotonic()-chip.epoch_starts[-1])*1000)
+
+    gnss.subscribe(on_fix=on_fix)
+    t0 = time.monotonic()
+    gnss.start(baud=args.baud if args.baud!=args.power_on_baud else None)
+    print("start:      %7.1f ms (baud %d)" % ((time.monotonic()-t0)*1000,gnss.baud))
+    t0 = time.monotonic()
+    gnss.set_rate(args.rate)
+    print("set_rate:   %7.1f ms" % ((time.monotonic()-t0)*1000))
+
+    time.sleep(args.seconds)
+    t0 = time.monotonic()
+    gnss.pause()
+    print("pause:      %7.1f ms" % ((time.monotonic()-t0)*1000))
+    t0 = time.monotonic()
+    gnss.resume()
+    print("resume:     %7.1f ms" % ((time.monotonic()-t0)*1000))
+    print("fixes:      %d in %.1f s, last %r" % (len(delays),args.seconds,gnss.fix()))
+    print("fix delay:  p50 %.1f ms, p99 %.1f ms, max %.1f ms" % (
+        percentile(delays,50),percentile(delays,99),max(delays) if delays else float("nan")))
+    gnss.stop()
+    chip.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log",help="NMEA log to replay")
+    parser.add_argument("--nmea",help="lib-quectel-nmea checkout (default: $L76_NMEA_PATH)")
+    parser.add_argument("--rate",type=int,default=1000,help="fix period in ms")
+    parser.add_argument("--baud",type=int,default=9600,help="baudrate negotiated at start")
+    parser.add_argument("--power-on-baud",type=int,default=9600)
+    parser.add_argument("--sentences",type=lambda s: tuple(s.split(",")),default=None,
+        help="comma separated sentence types to enable, e.g. RMC,GGA,GSA")
+    parser.add_argument("--seconds",type=float,default=5)
+    run(parser.parse_args())
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Simulated Quectel L76 for host-side runs of the driver.
+
+:class:`SimulatedL76` replays an NMEA log one epoch per fix period and delivers the bytes with the timing
+of the current baudrate. It answers the PMTK commands used by the driver:
+
+    * 101/102/103/104: restart, output resumes after ``restart_time`` ms with ``$PMTK010,001``;
+      104 also restores the factory settings (power-on baudrate, default output, 1000 ms fix period)
+    * 161: standby, output stops until the next restart command
+    * 220: fix period
+    * 251: baudrate (bytes read by a port opened at another baudrate are garbled)
+    * 314: enabled sentence types
+    * 253: switch to the binary protocol, where EPO packets (722) are acknowledged (723)
+    * 607: EPO status (707), reporting the EPO sets uploaded
+    * 740/741: reference time and position, recorded in ``hints``
+    * 225: power mode; in periodic mode (2) output stops during the sleep windows and a write
+      received while sleeping only wakes the chip up (a new run window starts, the command is lost)
+
+The chip can also be read through its DDC (I2C) interface at address 0x10 (:meth:`SimulatedL76.open_i2c`):
+reads return the pending output padded with 0x0a filler bytes.
+
+Commands are acknowledged with PMTK001 (except restarts and baudrate changes, as the real chip).
+
+    """
+
+import threading
+import time
+
+# PMTK314 field order
+_TYPES_314 = ("GLL","RMC","VTG","GGA","GSA","GSV")
+
+
+def checksum(body):
+    crc = 0
+    for c in body:
+        crc^=c
+    return crc
+
+
+def sentence(body):
+    """Frame *body* (bytes without ``$`` and checksum) as an NMEA sentence."""
+    return b"$"+body+b"*%02X\r\n" % checksum(body)
+
+
+def load_epochs(path):
+    """Read an NMEA log and group its sentences in epochs, each starting with a RMC sentence."""
+    with open(path,"rb") as f:
+        return split_epochs(f.read().splitlines())
+
+
+def split_epochs(lines):
+    epochs = []
+    current = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith(b"$"):
+            continue
+        if line[3:6]==b"RMC" and current:
+            epochs.append(current)
+            current = []
+        current.append(line+b"\r\n")
+    if current:
+        epochs.append(current)
+    return epochs
+
+
+class SimulatedPort():
+    """Serial port handle returned by ``streams.serial`` for a :class:`SimulatedL76`."""
+
+    def __init__(self,chip,baud):
+        self.chip = chip
+        self.baud = baud
+        self.closed = False
+
+    def write(self,data):
+        if isinstance(data,str):
+            data = data.encode()
+        self.chip._receive(bytes(data),self.baud)
+        return len(data)
+
+    def available(self):
+        return self.chip._available()
+
+    def readinto(self,buf):
+        return self.chip._readinto(buf,self.baud)
+
+    def read(self,n=1):
+        buf = bytearray(n)
+        got = 0
+        while got<n:
+            got+=self.readinto(memoryview(buf)[got:])
+        return bytes(buf)
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedDDC():
+    """I2C device handle returned by ``i2c.I2C`` for a :class:`SimulatedL76`."""
+
+    def __init__(self,chip):
+        self.chip = chip
+        self.closed = False
+        self.reads = 0
+
+    def write(self,data):
+        self.chip._receive(bytes(data),self.chip.baud)
+
+    def read(self,n):
+        self.reads+=1
+        return self.chip._read_ddc(n)
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedL76():
+    """
+    Simulated L76 replaying *epochs* (lists of sentences, see :func:`load_epochs`) in a loop.
+
+    *rate* is the initial fix period in milliseconds and *baud* the power-on baudrate.
+    With *realtime* false, byte timing is skipped and epochs are sent back to back (throughput runs).
+    """
+
+    def __init__(self,epochs,rate=1000,baud=9600,restart_time=100,realtime=True):
+        self.epochs = epochs
+        self.rate = rate
+        self.baud = baud
+        self.power_on_baud = baud
+        self.restart_time = restart_time
+        self.realtime = realtime
+        self.enabled = None
+        self.standby = False
+        self.commands = []
+        self.binary = False
+        self.epo = bytearray()
+        self.epo_nack = 0
+        self.epoch_starts = []
+        self.hints = []
+        self.power = (0,)
+        self._phase = 0
+        self.bytes_sent = 0
+        self._out = bytearray()
+        self._cond = threading.Condition()
+        self._wakeup = 0
+        self._running = True
+        self._th = threading.Thread(target=self._loop,daemon=True)
+        self._th.start()
+
+    def open(self,baud):
+        # a newly opened port has an empty receive buffer
+        with self._cond:
+            self._out.clear()
+        return SimulatedPort(self,baud)
+
+    def open_i2c(self,addr,clock):
+        if addr!=0x10:
+            raise OSError("no I2C device at 0x%02x" % addr)
+        return SimulatedDDC(self)
+
+    def close(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def reset(self):
+        """Hardware reset: back to power-on baudrate and default output."""
+        with self._cond:
+            self.baud = self.power_on_baud
+            self.enabled = None
+            self.standby = False
+            self._out.clear()
+            self._wakeup = time.monotonic()+self.restart_time/1000
+
+    def reset_pin(self,active=0):
+        """Return a ``digitalWrite`` callback resetting the chip when the pin is released."""
+        state = [None]
+
+        def cb(value):
+            if state[0]==active and value!=active:
+                self.reset()
+            state[0] = value
+        return cb
+
+    ##################### chip side
+
+    def _loop(self):
+        n = 0
+        while self._running:
+            start = time.monotonic()
+            if not self.standby and not self.binary and start>=self._wakeup and not self._asleep():
+                epoch = self.epochs[n%len(self.epochs)]
+                n+=1
+                self.epoch_starts.append(time.monotonic())
+                for line in epoch:
+                    if self.standby or self.binary:
+                        break
+                    if self.enabled is None or line[3:6] in self.enabled:
+                        self._emit(line)
+            if self.realtime:
+                left = self.rate/1000-(time.monotonic()-start)
+                if left>0:
+                    time.sleep(left)
+            elif self.standby:
+                time.sleep(0.001)
+
+    def _emit(self,data):
+        if self.realtime:
+            # 10 bits per byte on the wire
+            time.sleep(len(data)*10/self.baud)
+        with self._cond:
+            self._out.extend(data)
+            self.bytes_sent+=len(data)
+            self._cond.notify_all()
+
+    def _asleep(self):
+        if self.power[0]!=2:
+            return False
+        run,sleep = self.power[1],self.power[2]
+        return (time.monotonic()-self._phase)*1000%(run+sleep)>=run
+
+    def _receive(self,data,baud):
+        if baud!=self.baud:
+            return
+        if self._asleep():
+            self._phase = time.monotonic()
+            return
+        if self.binary:
+            self._receive_binary(data)
+            return
+        for line in data.split(b"\r\n"):
+            if line.startswith(b"$PMTK") and b"*" in line:
+                self._command(line[5:line.index(b"*")])
+
+    def _command(self,body):
+        fields = body.split(b",")
+        num = int(fields[0])
+        self.commands.append(body)
+        if num in (101,102,103,104):
+            if num==104:
+                # full cold start: factory settings
+                self.baud = self.power_on_baud
+                self.enabled = None
+                self.rate = 1000
+            self.standby = False
+            self._wakeup = time.monotonic()+self.restart_time/1000
+            threading.Timer(self.restart_time/1000,self._emit,(sentence(b"PMTK010,001"),)).start()
+            return
+        if num==251:
+            self.baud = int(fields[1])
+            return
+        if num==253:
+            self.binary = fields[1]==b"1"
+            return
+        if num==607:
+            sets = (len(self.epo)//72+31)//32
+            self._emit(sentence(b"PMTK707,%d,2200,0,2200,%d,0,0,0,0" % (sets,max(0,sets-1)*21600)))
+            return
+        if num==161:
+            self._ack(num,3)
+            self.standby = True
+            return
+        if num==220:
+            rate = int(fields[1])
+            if rate<100 or rate>10000:
+                self._ack(num,2)
+                return
+            self.rate = rate
+        elif num==225:
+            self.power = tuple(int(f) for f in fields[1:])
+            self._phase = time.monotonic()
+            if self.power[0]!=2:
+                self.power = self.power[:1]
+        elif num in (740,741):
+            self.hints.append(fields)
+        elif num==314:
+            if fields[1]==b"-1":
+                self.enabled = None
+            else:
+                self.enabled = set()
+                for i in range(len(_TYPES_314)):
+                    if fields[i+1]!=b"0":
+                        self.enabled.add(_TYPES_314[i].encode())
+                if len(fields)>18 and fields[18]!=b"0":
+                    self.enabled.add(b"ZDA")
+        else:
+            self._ack(num,1)
+            return
+        self._ack(num,3)
+
+    def _receive_binary(self,data):
+        # one packet per write: 04 24 len(2) cmd(2) payload chk 0d 0a
+        if len(data)<9 or data[0]!=0x04 or data[1]!=0x24 or len(data)!=data[2]|(data[3]<<8):
+            return
+        if checksum(data[2:-3])!=data[-3]:
+            return
+        cmd = data[4]|(data[5]<<8)
+        payload = data[6:-3]
+        self.commands.append(b"BIN%d" % cmd)
+        if cmd==722:
+            seq = payload[0]|(payload[1]<<8)
+            if self.epo_nack>0:
+                self.epo_nack-=1
+                result = 0
+            else:
+                result = 1
+                if seq!=0xffff:
+                    self.epo.extend(payload[2:])
+            ack = bytearray(b"\x04\x24\x0c\x00\xd3\x02")+bytes((payload[0],payload[1],result))
+            ack.append(checksum(ack[2:]))
+            self._emit(bytes(ack)+b"\r\n")
+        elif cmd==253:
+            self.binary = payload[0]!=0
+
+    def _ack(self,num,flag):
+        self._emit(sentence(b"PMTK001,%d,%d" % (num,flag)))
+
+    ##################### port side
+
+    def _available(self):
+        with self._cond:
+            return len(self._out)
+
+    def _read_ddc(self,n):
+        # never blocks: the DDC buffer is padded with 0x0a when empty
+        with self._cond:
+            data = bytes(self._out[:n])
+            del self._out[:n]
+        return data+b"\x0a"*(n-len(data))
+
+    def _readinto(self,buf,baud):
+        with self._cond:
+            while not self._out and self._running:
+                self._cond.wait(0.1)
+            n = min(len(buf),len(self._out))
+            data = self._out[:n]
+            del self._out[:n]
+        if baud!=self.baud:
+            # wrong speed: the receiver sees noise
+            data = bytes(b^0x5a for b in data)
+        buf[:n] = data
+        return n
@@ -0,0 +1,205 @@
+"""
+Host checks of the L76 driver on ``transport.MemoryTransport`` and :class:`simulator.SimulatedL76`.
+
+    L76_NMEA_PATH=../lib-quectel-nmea python -m pytest -q host
+
+Skipped when no ``lib-quectel-nmea`` checkout is configured.
+
+    """
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import simulator
+import zerynth
+
+try:
+    l76 = zerynth.load_driver()
+except ImportError as e:
+    pytest.skip(str(e),allow_module_level=True)
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),"logs","l76_1hz.nmea")
+EPOCHS = simulator.load_epochs(LOG)
+RMC = [line for line in EPOCHS[0] if line[3:6]==b"RMC"][0]
+
+
+def memory_l76(on_write=None,**kwargs):
+    port = l76.tr.MemoryTransport(on_write=on_write)
+    gnss = l76.L76(None,transport=port,**kwargs)
+    gnss.talking = True
+    return gnss,port
+
+
+def received(gnss):
+    return sum(gnss.stats()["sentences"].values())
+
+
+##################### framing
+
+def test_frame_partial_line():
+    gnss,_ = memory_l76()
+    gnss.feed(RMC[:20])
+    assert received(gnss)==0
+    gnss.feed(RMC[20:])
+    assert received(gnss)==1
+    # lines split anywhere, garbage in between
+    data = b"\x00garbage"+b"".join(EPOCHS[1])
+    for i in range(len(data)):
+        gnss.feed(data[i:i+1])
+    assert received(gnss)==1+len(EPOCHS[1])
+    assert gnss.stats()["overflows"]==0
+
+
+def test_frame_overflow():
+    gnss,_ = memory_l76()
+    # terminated line longer than MAX_LINE
+    gnss.feed(b"$GP"+b"x"*(l76.MAX_LINE+10)+b"\r\n"+RMC)
+    assert gnss.stats()["overflows"]==1
+    assert received(gnss)==1
+    # runaway line without terminator, then a sentence
+    gnss.feed(b"$GP"+b"y"*(2*l76.RXBUF_SIZE))
+    assert gnss.stats()["overflows"]>=2
+    gnss.feed(b"\r\n"+RMC)
+    assert received(gnss)==2
+
+
+def test_frame_checksum_error():
+    gnss,_ = memory_l76()
+    bad = bytearray(RMC)
+    bad[10]^=1
+    gnss.feed(bytes(bad)+RMC)
+    assert gnss.stats()["checksum_errors"]==1
+    assert received(gnss)==1
+
+
+##################### fixed point decoding
+
+def test_decimal():
+    assert l76._decimal(b"-12.345",0,7,2)==-1234
+    assert l76._decimal(b"7",0,1,3)==7000
+    assert l76._decimal(b"0.5",0,3,0)==0
+    assert l76._decimal(b"1.25",0,4,2)==125
+    assert l76._decimal(b",",0,0,2) is None
+
+
+def test_coord_round_trip():
+    assert l76._coord(b"4527.8594",0,9,False)==454643233
+    assert l76._coord(b"00909.4097",0,10,True)==-91568283
+    for deg in (0,1,45,89,179):
+        for mmmmm in (0,1,123456,2999999,5999999):
+            text = b"%03d%02d.%05d" % (deg,mmmmm//100000,mmmmm%100000)
+            expected = deg*10000000+mmmmm*10000000/6000000
+            assert abs(l76._coord(text,0,len(text),False)-expected)<=1
+
+
+def test_utc_round_trip():
+    for utc in ((2000,1,1,0,0,0,0),(2024,2,29,23,59,59,0),(2024,3,1,0,0,0,0),(2026,12,31,12,30,15,0),(2099,12,31,23,59,59,0)):
+        assert l76._utc(l76._seconds(utc))==utc
+    for secs in range(0,100*365*86400,7777777):
+        assert l76._seconds(l76._utc(secs))==secs
+    assert l76._seconds((2000,3,1,0,0,0,0))==60*86400
+
+
+##################### acknowledges
+
+def ack_on_write(flags):
+    # answer PMTK commands with the PMTK001 flag in flags (no answer if missing)
+    state = {}
+
+    def on_write(data):
+        data = bytes(data)
+        if not data.startswith(b"$PMTK"):
+            return
+        num = int(data[5:8])
+        if num in flags:
+            state["gnss"].feed(simulator.sentence(b"PMTK001,%d,%d" % (num,flags[num])))
+    return state,on_write
+
+
+def test_ack_routing():
+    state,on_write = ack_on_write({220: 3, 225: 3, 999: 1, 314: 0, 741: 2})
+    gnss,port = memory_l76(on_write)
+    state["gnss"] = gnss
+    gnss.running = True
+    gnss.send(220,(200,))
+    assert port.written.endswith(l76.pmtk.command(220,200))
+    with pytest.raises(zerynth.UnsupportedError):
+        gnss.send(999)
+    with pytest.raises(ValueError):
+        gnss.send(314,(0,))
+    with pytest.raises(RuntimeError):
+        gnss.send(741,(0,0,0,2026,1,1,0,0,0))
+    # the acknowledged settings are kept
+    gnss.set_rate(500)
+    gnss.set_power_mode(l76.POWER_PERIODIC,1000,2000)
+    assert gnss._rate==500
+    assert gnss.power_mode()==(l76.POWER_PERIODIC,1000,2000,0,0)
+    assert gnss._acks=={}
+
+
+def test_ack_timeout():
+    state,on_write = ack_on_write({})
+    gnss,_ = memory_l76(on_write)
+    state["gnss"] = gnss
+    gnss.running = True
+    t = time.monotonic()
+    with pytest.raises(TimeoutError):
+        gnss.send(220,(200,),timeout=50)
+    assert time.monotonic()-t<1
+    # a late acknowledge is not routed to the next command
+    gnss.feed(simulator.sentence(b"PMTK001,220,3"))
+    with pytest.raises(TimeoutError):
+        gnss.send(220,(200,),timeout=50)
+    with pytest.raises(RuntimeError):
+        memory_l76()[0].send(220,(200,))
+
+
+##################### lifecycle
+
+@pytest.fixture
+def chip():
+    c = simulator.SimulatedL76(EPOCHS,rate=200)
+    zerynth.attach(zerynth.SERIAL1,c)
+    yield c
+    c.close()
+
+
+def wait_fix(gnss,seconds=3):
+    t = time.monotonic()
+    while time.monotonic()-t<seconds:
+        if gnss.has_fix():
+            return gnss.fix()
+        time.sleep(0.05)
+    return None
+
+
+def test_start_stop_start(chip):
+    gnss = l76.L76(zerynth.SERIAL1,sentences=("RMC","GGA","GSA"))
+    assert gnss.start(mode=l76.HOT_START)
+    assert not gnss.start()
+    gnss.set_rate(200)
+    assert wait_fix(gnss) is not None
+    assert gnss.ttff()[0]==l76.HOT_START
+
+    assert gnss.stop()
+    assert gnss.th is None
+    assert not gnss.running
+    assert not gnss.stop()
+    with pytest.raises(RuntimeError):
+        gnss.set_rate(1000)
+
+    n = len(chip.commands)
+    assert gnss.start(mode=l76.COLD_START)
+    assert wait_fix(gnss) is not None
+    ttff = gnss.ttff()
+    assert ttff[0]==l76.COLD_START and ttff[1] is not None and ttff[1]>=chip.restart_time
+    # output set again, no hint after a cold start
+    assert chip.commands[n:n+2]==[b"103",b"314,0,1,0,1,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0"]
+    assert not chip.hints
+    assert gnss.stop()
+    assert chip.standby
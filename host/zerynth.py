@@ -0,0 +1,212 @@
+"""
+CPython stand-ins for the Zerynth runtime used by the L76 driver.
+
+:func:`install` puts in place the builtins (``sleep``, ``thread``, pin functions, exceptions),
+the ``streams`` and ``timers`` modules and a Zerynth flavoured ``threading`` (timeouts in milliseconds),
+then :func:`load_driver` imports ``quectel.l76.l76`` from this checkout on top of a real
+``quectel.nmea`` library checkout.
+
+Serial ports are objects registered with :func:`attach` (for example a :class:`simulator.SimulatedL76`);
+``streams.serial(ifc, baud=...)`` returns ``port.open(baud)`` and ``i2c.I2C(ifc, addr, clock)``
+talks to ``port.open_i2c(addr, clock)``.
+
+    """
+
+import builtins
+import importlib
+import os
+import sys
+import threading as _threading
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# serial interface names as exposed by Zerynth boards
+SERIAL0 = 0
+SERIAL1 = 1
+SERIAL2 = 2
+SERIAL3 = 3
+SERIAL4 = 4
+I2C0 = 10
+I2C1 = 11
+
+HIGH = 1
+LOW = 0
+OUTPUT_PUSHPULL = 1
+
+_ports = {}
+_pins = {}
+
+
+class UnsupportedError(Exception):
+    pass
+
+
+def sleep(ms):
+    time.sleep(ms/1000)
+
+
+def thread(fn,*args):
+    th = _threading.Thread(target=fn,args=args,daemon=True)
+    th.start()
+    return th
+
+
+def pinMode(pin,mode):
+    pass
+
+
+def digitalWrite(pin,value):
+    cb = _pins.get(pin)
+    if cb is not None:
+        cb(value)
+
+
+def attach(ifc,port):
+    """Make ``streams.serial(ifc,...)`` return ``port.open(baud)`` (and ``i2c.I2C(ifc,...)`` use ``port.open_i2c``)."""
+    _ports[ifc] = port
+
+
+def attach_pin(pin,callback):
+    """Call ``callback(value)`` on every ``digitalWrite(pin,value)``."""
+    _pins[pin] = callback
+
+
+def now():
+    """Milliseconds from an arbitrary origin, as ``timers.now()``."""
+    return int(time.monotonic()*1000)
+
+
+class Lock():
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+
+    def acquire(self,blocking=True,timeout=-1):
+        if timeout<0:
+            return self._lock.acquire(blocking)
+        return self._lock.acquire(blocking,timeout/1000)
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self,*exc):
+        self.release()
+
+
+class Event():
+
+    def __init__(self):
+        self._event = _threading.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self,timeout=-1):
+        if timeout<0:
+            return self._event.wait()
+        return self._event.wait(timeout/1000)
+
+
+def _module(name,**attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    return mod
+
+
+def _serial(ifc,baud=115200,set_default=True,**kwargs):
+    if ifc not in _ports:
+        raise OSError("no port attached to interface %r" % (ifc,))
+    return _ports[ifc].open(baud)
+
+
+class I2C():
+
+    def __init__(self,drvname,addr=0,clock=100000):
+        if drvname not in _ports:
+            raise OSError("no port attached to interface %r" % (drvname,))
+        self._dev = _ports[drvname].open_i2c(addr,clock)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self._dev.close()
+
+    def read(self,n,timeout=-1):
+        return self._dev.read(n)
+
+    def write(self,data,timeout=-1):
+        self._dev.write(data)
+
+
+def _native_c(name,sources,*args,**kwargs):
+    # native functions are not available on the host: keep the Python body
+    def deco(fn):
+        return fn
+    return deco
+
+
+zthreading = _module("threading",Lock=Lock,Event=Event,Thread=_threading.Thread)
+streams = _module("streams",serial=_serial)
+timers = _module("timers",now=now)
+i2c = _module("i2c",I2C=I2C)
+
+
+def install():
+    """Install the runtime stand-ins (idempotent)."""
+    for name,value in (
+        ("sleep",sleep),("thread",thread),("pinMode",pinMode),("digitalWrite",digitalWrite),
+        ("HIGH",HIGH),("LOW",LOW),("OUTPUT_PUSHPULL",OUTPUT_PUSHPULL),
+        ("UnsupportedError",UnsupportedError),("native_c",_native_c),
+        ("SERIAL0",SERIAL0),("SERIAL1",SERIAL1),("SERIAL2",SERIAL2),("SERIAL3",SERIAL3),("SERIAL4",SERIAL4),
+        ("I2C0",I2C0),("I2C1",I2C1)):
+        setattr(builtins,name,value)
+    sys.modules["streams"] = streams
+    sys.modules["timers"] = timers
+    sys.modules["i2c"] = i2c
+
+
+def load_driver(nmea_path=None):
+    """
+    Import and return the ``l76`` driver module.
+
+    *nmea_path* is the directory of a ``lib-quectel-nmea`` checkout (the one containing ``nmea.py``),
+    defaulting to the ``L76_NMEA_PATH`` environment variable.
+    """
+    install()
+    nmea_path = nmea_path or os.environ.get("L76_NMEA_PATH")
+    if not nmea_path or not os.path.isfile(os.path.join(nmea_path,"nmea.py")):
+        raise ImportError("quectel.nmea not found: pass the lib-quectel-nmea checkout or set L76_NMEA_PATH")
+    quectel = sys.modules.get("quectel")
+    if quectel is None:
+        quectel = _module("quectel",__path__=[])
+        sys.modules["quectel"] = quectel
+    for name,path in (("nmea",nmea_path),("l76",ROOT)):
+        full = "quectel."+name
+        if full not in sys.modules:
+            pkg = _module(full,__path__=[path])
+            sys.modules[full] = pkg
+            setattr(quectel,name,pkg)
+    # the driver modules see the Zerynth threading, the rest of the process the real one
+    real = sys.modules["threading"]
+    sys.modules["threading"] = zthreading
+    try:
+        return importlib.import_module("quectel.l76.l76")
+    finally:
+        sys.modules["threading"] = real
@@ -14,32 +14,93 @@ The following functionalities are implemented:
     * retrieve the current UTC time
 
 The driver starts a background thread continuously tracking the last available location fix. The frequency of fixes can be customized.
-The driver support serial mode only.
+The driver supports serial and I2C (DDC) modes, or any link implementing the interface of the :mod:`transport` module.
 
-Location fixes are obtained by parsing NMEA sentences of type RMC and GGA. Obtaining a fix or UTC time are thread safe operations.
+Location fixes are obtained by parsing NMEA sentences of type RMC, GGA and GSA in place, with integer arithmetic only. Obtaining a fix or UTC time are thread safe operations.
 
     """
 
-import streams
 import threading
+import timers
 from quectel.nmea import nmea
+from quectel.l76 import pmtk
+from quectel.l76 import transport as tr
 
 SERIAL=0
 I2C=1
 
+# kinds of start
+AUTO_START=-1
+HOT_START=0
+WARM_START=1
+COLD_START=2
+FULL_COLD_START=3
+# age of the last fix after which AUTO_START does not hot start (ephemeris last about 4 hours, milliseconds)
+EPHEMERIS_VALIDITY=4*3600*1000
+
+# receive buffer size: room for a full NMEA line plus the bytes read after it
+RXBUF_SIZE=512
+# longest line accepted by the framer (same limit as the old readline buffer)
+MAX_LINE=256
+
+# NMEA sentence types in PMTK314 field order (fields 6-16 are reserved, 17 is ZDA)
+NMEA_TYPES=("GLL","RMC","VTG","GGA","GSA","GSV")
+# sentences needed to build a fix
+FIX_SENTENCES=("RMC","GGA","GSA")
+# default histogram bucket bounds of the profiler (clock units)
+PROFILE_BUCKETS=(1,2,5,10,20,50,100,200,500,1000)
+# max number of fields split from a sentence
+MAX_FIELDS=20
+# longest RMC/GGA/GSA sentence kept for decoding (NMEA limits sentences to 82 characters)
+MAX_SENTENCE=96
+
+# default time to wait for a PMTK001 acknowledge (milliseconds)
+ACK_TIMEOUT=1000
+# EPO upload: satellite records per packet, bytes per record, attempts per packet
+EPO_SATS_PER_PACKET=3
+EPO_RECORD_SIZE=72
+EPO_RETRIES=3
+# upper bounds for the first sentence after a hardware reset and after a hot start/wakeup (milliseconds)
+BOOT_TIME=2000
+WAKEUP_TIME=1000
+
+# power modes (PMTK225)
+POWER_NORMAL=0
+POWER_PERIODIC=2
+POWER_ALWAYSLOCATE=8
+# run and sleep windows of POWER_PERIODIC (milliseconds)
+MIN_WINDOW=1000
+MAX_WINDOW=518400000
+# fix periods without sentences after which a fix is considered stale
+STALE_PERIODS=3
+# wait for the acknowledge of a command that may only wake the L76 up, before sending it again (milliseconds, well below MIN_WINDOW)
+WAKE_TIMEOUT=150
+# output that may be queued on the UART ahead of an acknowledge (bytes)
+UART_BACKLOG=512
+
 class L76(nmea.NMEA_Receiver):
     """
-.. class:: L76(ifc, mode=SERIAL, baud=9600,clock=400000, addr=0x00, reset=None, reset_on=0)
+.. class:: L76(ifc, mode=SERIAL, baud=9600,clock=400000, addr=0x00, reset=None, reset_on=0, sentences=None, history=0, fixed_point=False, hints=True, transport=None)
 
     Create an instance of the L76 class.
 
-    :param ifc: serial interface to use (for example :samp:`SERIAL1`, :samp:`SERIAL2`, etc...)
-    :param mode: one of SERIAL or I2C. Only SERIAL mode supported at the moment.
+    :param ifc: serial interface to use (for example :samp:`SERIAL1`, :samp:`SERIAL2`, etc...) or I2C bus in I2C mode (for example :samp:`I2C0`)
+    :param mode: one of SERIAL or I2C, selecting a :class:`transport.SerialTransport` or a :class:`transport.I2CTransport`.
+                 :ref:`set_baud` and :ref:`load_epo` are serial only.
     :param baud: serial port baudrate
-    :param clock: I2C clock frequency (not supported)
-    :param addr: I2C address (not supported)
+    :param clock: I2C clock frequency
+    :param addr: I2C address, 0 for the default :samp:`transport.DDC_ADDR`
     :param reset: optional reset pin
     :param reset_on: reset pin active level
+    :param sentences: optional tuple of NMEA sentence types to receive (for example :samp:`("RMC","GGA","GSA")`, see :samp:`FIX_SENTENCES`).
+                      Every other type is disabled on the chip with PMTK314 at :ref:`start` and discarded by the receiver thread before parsing.
+                      If *None*, the chip default output is kept and every sentence is parsed.
+    :param history: if greater than zero, keep the last *history* fixes in a :class:`FixHistory` available as :samp:`history`
+    :param fixed_point: if *True*, :ref:`fix` returns latitude and longitude as integers in 1e-7 degrees instead of floats
+    :param hints: if *True* (default), the last fix seen before :ref:`pause` or :ref:`stop` is injected with :ref:`inject` at every :ref:`resume` and at every hot or warm :ref:`start`,
+                  together with its UTC time advanced by the elapsed time
+    :param transport: optional transport (see the :mod:`transport` module) to use instead of the one built from *mode*, *ifc*, *baud*, *clock* and *addr*.
+                      It is owned by the L76 instance from now on.
 
     Example: ::
 
@@ -55,17 +116,74 @@ class L76(nmea.NMEA_Receiver):
 
     """
 
-    def __init__(self,ifc,mode=SERIAL,baud=9600,clock=400000,addr=0x00,reset=None,reset_on=0):
-        if mode!=SERIAL:
-            raise UnsupportedError
+    def __init__(self,ifc,mode=SERIAL,baud=9600,clock=400000,addr=0x00,reset=None,reset_on=0,sentences=None,history=0,fixed_point=False,hints=True,transport=None):
+        if transport is None:
+            if mode==SERIAL:
+                transport = tr.SerialTransport(ifc,baud)
+            elif mode==I2C:
+                transport = tr.I2CTransport(ifc,addr if addr else tr.DDC_ADDR,clock)
+            else:
+                raise UnsupportedError
         self.mode = mode
         self.ifc = ifc
-        self.baud = baud
+        self.transport = transport
+        self.baud = transport.baud
+        self.default_baud = transport.baud
+        self._newbaud = None
+        self._alive = threading.Event()
+        self._woke = True
+        self._acks = {}
+        self._replies = {}
+        self._binmode = False
+        self._binack = None
+        self._reset_stats()
+        self.profiler = None
+        self._cycle = None
+        self._lastcycle = None
+        self._ttffs = {}
+        self._fixtime = None
+        self._heard = None
+        self._rate = 1000
+        self._power = (POWER_NORMAL,0,0,0,0)
+        self.hints = hints
+        self._hint = None
+        self._tread = 0
+        self._tparsed = 0
+        self._on_fix = None
+        self._on_utc = None
+        self._on_fix_lost = None
+        self._epoch = 0
+        self._hadfix = False
+        self.history = None
+        if history>0:
+            self.history = FixHistory(history)
+        self.controller = None
+        self._notify = self.history is not None
+        self.fixed_point = fixed_point
+        self._fixlock = threading.Lock()
+        self._rmc = _Sentence()
+        self._gga = _Sentence()
+        self._gsa = _Sentence()
         self.running = False
         self.talking = False
         self.th = None
+        self._halt = False
+        self._wlock = threading.Lock()
+        self._cmdq = []
+        self._queued = False
         self.rstpin = reset
         self.rstval = reset_on
+        self._rx = bytearray(RXBUF_SIZE)
+        self._rxv = memoryview(self._rx)
+        self._rxlen = 0
+        self.sentences = sentences
+        self._accept = None
+        if sentences is not None:
+            self._accept = {}
+            for st in sentences:
+                if st!="ZDA" and st not in NMEA_TYPES:
+                    raise ValueError
+                self._accept[_typekey(ord(st[0]),ord(st[1]),ord(st[2]))] = True
         nmea.NMEA_Receiver.__init__(self)
         # exit reset
         if self.rstpin is not None:
@@ -75,46 +193,52 @@ class L76(nmea.NMEA_Receiver):
             sleep(100)
             digitalWrite(self.rstpin,HIGH^ self.rstval)
         sleep(2000) # boot time
+        # the link stays open for the lifetime of the instance
+        self.transport.open()
         # put in lowest power consumption mode
-        if self.mode==SERIAL:
-            self.drv = streams.serial(self.ifc,baud=self.baud,set_default=False)
-            self.drv.write("$PMTK161,0*28\r\n")
-            sleep(100)
-            self.drv.close()
-        self.drv = None
+        self._write(pmtk.STANDBY)
+        sleep(100)
 
-    def start(self):
+    def start(self,baud=None,mode=AUTO_START):
         """
-.. method:: start()
+.. method:: start(baud=None, mode=AUTO_START)
 
         Start the L76 and the receiver thread.
+        Returns as soon as the first valid sentence is received, or after :samp:`BOOT_TIME` (hardware reset)
+        or :samp:`WAKEUP_TIME` (restart command) milliseconds at most.
+
+        *mode* selects the kind of start:
+
+            * :samp:`HOT_START` (PMTK101): reuse every available data (time, position, ephemeris)
+            * :samp:`WARM_START` (PMTK102): discard ephemeris
+            * :samp:`COLD_START` (PMTK103): discard time, position, almanacs and ephemeris
+            * :samp:`FULL_COLD_START` (PMTK104): cold start restoring factory settings (baudrate and output sentences included).
+              If a reset pin is given, a hardware reset is performed instead.
+            * :samp:`AUTO_START`: hot start, unless the last fix is older than :samp:`EPHEMERIS_VALIDITY`
+              milliseconds, in which case a warm start is performed
+
+        The time to first fix of the start can be read with :ref:`ttff`.
+
+        If *baud* is given, the serial link is upgraded to that baudrate with :ref:`set_baud` once the L76 is running
+        (for example 115200 is needed to receive every default sentence at 10 Hz).
 
         :returns: *True* if receiver thread has been started, *False* if already active.
 
         """
         if self.th:
             return False
-        
-        if self.rstpin is None:
-            if self.mode==SERIAL:
-                self.drv = streams.serial(self.ifc,baud=self.baud,set_default=False)
-                self.drv.write("$PMTK101*32\r\n")
-                sleep(100)
-                self.drv.close()
-            else:
-                raise UnsupportedError
-
-        self.enable(True)
-        self.running = True
-        self.talking = True
+        mode,reset = self._start_begin(mode)
         self.th = thread(self._run)
 
-        # restart receiver
-        if self.rstpin is not None:
-            digitalWrite(self.rstpin,self.rstval)
-            sleep(100)
-            digitalWrite(self.rstpin,HIGH^ self.rstval)
-            sleep(2000) # boot time
+        # restart receiver and wait for its first sentence
+        if reset:
+            self._reset_pulse()
+            self._alive.wait(BOOT_TIME)
+        else:
+            self._alive.wait(WAKEUP_TIME)
+        self._restore(self._restore_commands(True,mode<=WARM_START))
+        if baud is not None and baud!=self.baud:
+            self.set_baud(baud)
         return True
 
     def stop(self):
@@ -122,6 +246,7 @@ class L76(nmea.NMEA_Receiver):
 .. method:: stop()
 
         Stop the L76 by using the lowest power consumption mode and terminates the receiver thread.
+        The receiver thread ends as soon as the standby command is acknowledged; the serial port is kept open.
         It can be restarted by calling :ref:`start`.
 
         :returns: *True* if receiver thread has been stopped, *False* if already inactive.
@@ -129,52 +254,51 @@ class L76(nmea.NMEA_Receiver):
         """
         if not self.running:
             return False
-        
-        if self.mode==SERIAL:
-            self.drv.write("$PMTK161,0*28\r\n")
-        else:
-            raise UnsupportedError
-        self.running = False
-        self.talking = False
-        sleep(1000)
-        self.enable(False)
+
+        self._stop_begin()
+        try:
+            self._wake_send(161,(0,))
+        except Exception as e:
+            self._stop_end(False)
+            raise e
+        self._stop_end(True)
+        t = timers.now()
+        while self.th is not None and timers.now()-t<ACK_TIMEOUT:
+            sleep(10)
+        if self.th is None:
+            # output still on the wire after the acknowledge: not to be taken for the next start
+            self._flush(self._wire_time(MAX_SENTENCE))
         return True
 
     def pause(self):
         """
 .. method:: pause()
 
-        Pause the L76 by putting it into standby mode. It can be restarted by calling :ref:`resume`.
+        Pause the L76 by putting it into standby mode. It can be restarted by calling :ref:`resume`,
+        which also restores the power mode set with :ref:`set_power_mode`.
         Refer to the L76 documentation for details `here <https://www.quectel.com/UploadImage/Downlad/Quectel_L76_Series_Hardware_Design_V3.1.pdf>`_
 
         """
         if not self.running:
             raise RuntimeError
-        if self.mode==SERIAL:
-            self.drv.write("$PMTK161,0*28\r\n")
-        else:
-            raise UnsupportedError
-        sleep(1000)
-        self.talking = False
-        self.enable(False)
+        self._save_hint()
+        self._wake_send(161,(0,))
+        self._pause_end()
 
     def resume(self):
         """
 .. method:: resume()
 
         Wake up the L76 from standby mode entered by calling :ref:`resume`.
+        Returns as soon as the first valid sentence is received, or after :samp:`WAKEUP_TIME` milliseconds at most.
         Refer to the L76 documentation for details `here <https://www.quectel.com/UploadImage/Downlad/Quectel_L76_Series_Hardware_Design_V3.1.pdf>`_
 
         """
         if not self.running:
             raise RuntimeError
-        if self.mode==SERIAL:
-            self.drv.write("$PMTK101*32\r\n")
-        else:
-            raise UnsupportedError
-        self.enable(True)
-        self.talking = True
-        sleep(1000) # wakeup time
+        self._resume_begin()
+        self._alive.wait(WAKEUP_TIME)
+        self._restore(self._restore_commands(False,True))
 
     def set_rate(self,rate=1000):
         """
@@ -185,33 +309,70 @@ class L76(nmea.NMEA_Receiver):
         """
         if not self.running:
             raise RuntimeError
-        msg = "PMTK220,"+str(rate)
-        crc=ord(msg[0])
-        for i in range(1,len(msg)):
-            crc = crc^ord(msg[i])
-        msg="$"+msg+"*"+hex(crc,"")+"\r\n"
-        if self.mode==SERIAL:
-            self.drv.write(msg)
-        else:
-            raise UnsupportedError
+        self._wake_send(220,(rate,))
 
-    ##################### Private
+    def set_power_mode(self,mode=POWER_NORMAL,run_time=0,sleep_time=0,second_run_time=0,second_sleep_time=0,timeout=ACK_TIMEOUT):
+        """
+.. method:: set_power_mode(mode=POWER_NORMAL, run_time=0, sleep_time=0, second_run_time=0, second_sleep_time=0, timeout=ACK_TIMEOUT)
 
-    def _run(self):
+        Select the power mode of the L76 with PMTK225:
+
+            * :samp:`POWER_NORMAL`: always tracking (default)
+            * :samp:`POWER_PERIODIC`: periodic standby mode, the L76 tracks for *run_time* milliseconds
+              and stays in standby for *sleep_time* milliseconds, over and over. If *second_run_time* and *second_sleep_time*
+              are given, they are used in place of the first ones when no fix could be obtained during a run window.
+              Windows range from :samp:`MIN_WINDOW` to :samp:`MAX_WINDOW` milliseconds
+            * :samp:`POWER_ALWAYSLOCATE`: AlwaysLocate standby mode, the L76 adapts its duty cycle to the environment and motion
+
+        The mode is kept by :ref:`pause` / :ref:`resume` and by :ref:`stop` / :ref:`start`, where it is set again once the L76 is running.
+
+        While a low power mode is active, no sentences are received during the sleep windows: the fix is considered stale
+        (see :ref:`fix`) only when no sentence arrives for :samp:`STALE_PERIODS` fix periods plus the longest sleep window
+        (never in :samp:`POWER_ALWAYSLOCATE`, whose windows are not known), and the baudrate verification of :ref:`set_baud` waits for
+        the longest sleep window too.
+        Commands sent during a sleep window wake the L76 up and are repeated once if not acknowledged: within :samp:`WAKE_TIMEOUT` milliseconds
+        if no sentence was received for a fix period, otherwise within the timeout plus the time to send :samp:`UART_BACKLOG` bytes of output queued ahead of the acknowledge.
+
+        Raises *ValueError* for invalid modes or windows and the same exceptions of :ref:`send`.
+
+        """
+        if mode==POWER_PERIODIC:
+            for w in (run_time,sleep_time):
+                if w<MIN_WINDOW or w>MAX_WINDOW:
+                    raise ValueError
+            for w in (second_run_time,second_sleep_time):
+                if w!=0 and (w<MIN_WINDOW or w>MAX_WINDOW):
+                    raise ValueError
+            power = (mode,run_time,sleep_time,second_run_time,second_sleep_time)
+        elif mode==POWER_NORMAL or mode==POWER_ALWAYSLOCATE:
+            power = (mode,0,0,0,0)
+        else:
+            raise ValueError
+        if not self.running:
+            raise RuntimeError
+        self._wake_send(225,_power_args(power),timeout)
+
+    def power_mode(self):
         """
-----
-NMEA
-----
+.. method:: power_mode()
+
+        Return the power mode set with :ref:`set_power_mode` as a tuple :samp:`(mode, run_time, sleep_time, second_run_time, second_sleep_time)`.
 
-    Additional methods from the base class :any:`nmea.NMEA_Receiver`.
+        """
+        return self._power
 
+    def fix(self):
+        """
 .. method:: fix()
 
         Return the current fix or *None* if not available.
+        While the L76 is running and not paused, a fix is also not available when it is stale: no valid sentence has been received
+        for :samp:`STALE_PERIODS` fix periods (plus the longest sleep window of :samp:`POWER_PERIODIC`, see :ref:`set_power_mode`).
+
         A fix is a tuple with the following elements:
 
-            * latitude in decimal format (-89.9999 - 89.9999)
-            * longitude in decimal format (-179.9999 - 179.9999)
+            * latitude in decimal format (-89.9999 - 89.9999), or in 1e-7 degrees if *fixed_point* is set
+            * longitude in decimal format (-179.9999 - 179.9999), or in 1e-7 degrees if *fixed_point* is set
             * altitude in meters
             * speed in Km/h
             * course over ground as degrees from true north
@@ -221,10 +382,50 @@ NMEA
             * positional dilution of precision (0.5 - 99.9)
             * UTC time as a tuple (yyyy,MM,dd,hh,mm,ss,microseconds)
 
+        """
+        self._fixlock.acquire()
+        try:
+            if not self._has_fix() or self._stale():
+                return None
+            rmc = self._rmc
+            lat = rmc.coord(3)
+            lon = rmc.coord(5)
+            if not self.fixed_point:
+                lat = lat/10000000
+                lon = lon/10000000
+            speed = rmc.decimal(7,3)
+            if speed is not None:
+                # thousandths of knot to Km/h
+                speed = speed*0.001852
+            return (
+                lat,
+                lon,
+                _real(self._gga.decimal(9,2),100),
+                speed,
+                _real(rmc.decimal(8,2),100),
+                self._gga.decimal(7,0) or 0,
+                _real(self._hdop(),100),
+                _real(self._gsa.decimal(17,2),100),
+                _real(self._gsa.decimal(15,2),100),
+                self._utc_tuple()
+            )
+        finally:
+            self._fixlock.release()
+
+    def has_fix(self):
+        """
 .. method:: has_fix()
-    
-        Return *True* if a fix is available
 
+        Return *True* if a fix is available (and not stale, see :ref:`fix`)
+
+        """
+        self._fixlock.acquire()
+        res = self._has_fix() and not self._stale()
+        self._fixlock.release()
+        return res
+
+    def utc(self):
+        """
 .. method:: utc()
 
         Return the current UTC time or *None* if not available.
@@ -232,30 +433,1533 @@ NMEA
 
         UTC time can be wrong if no fix has ever been obtained.
 
+        """
+        self._fixlock.acquire()
+        res = self._utc_tuple()
+        self._fixlock.release()
+        return res
+
+    def has_utc(self):
+        """
 .. method:: has_utc()
-    
+
         Return *True* if a UTC time is available
 
         """
-        buffer = bytearray(256)
-        if self.mode==SERIAL:
-            self.drv = streams.serial(self.ifc,baud=self.baud,set_default=False)
+        self._fixlock.acquire()
+        res = self._rmc.hhmmss(1) is not None and self._rmc.ddmmyy(9) is not None
+        self._fixlock.release()
+        return res
+
+    def stats(self,reset=False):
+        """
+.. method:: stats(reset=False)
+
+        Return the receive path counters as a dictionary:
+
+            * :samp:`bytes`: bytes read from the L76
+            * :samp:`sentences`: dictionary of sentences with a valid checksum per type (for example :samp:`"RMC"`)
+            * :samp:`proprietary`: proprietary sentences (:samp:`$P...`, for example PMTK replies) with a valid checksum
+            * :samp:`filtered`: sentences discarded by the *sentences* filter
+            * :samp:`checksum_errors`: malformed sentences or sentences with a wrong checksum
+            * :samp:`overflows`: lines longer than 256 bytes, dropped
+            * :samp:`exceptions`: exceptions caught in the receiver thread loop
+            * :samp:`last_sentence`: value of :samp:`timers.now()` at the last valid sentence, *None* if none yet
+
+        If *reset* is *True*, counters are zeroed after being read.
+
+        """
+        types = {}
+        for key in self._types:
+            types[chr(key>>16)+chr((key>>8)&0xff)+chr(key&0xff)] = self._types[key]
+        res = {
+            "bytes": self._nbytes,
+            "sentences": types,
+            "proprietary": self._nprop,
+            "filtered": self._nfiltered,
+            "checksum_errors": self._nchs,
+            "overflows": self._noverflow,
+            "exceptions": self._nexc,
+            "last_sentence": self._last
+        }
+        if reset:
+            self._reset_stats()
+        return res
+
+    def ttff(self):
+        """
+.. method:: ttff()
+
+        Return the timings of the last :ref:`start` or :ref:`resume` as a tuple :samp:`(kind, sentence, utc, fix)`:
+        *kind* is one of :samp:`HOT_START`, :samp:`WARM_START`, :samp:`COLD_START`, :samp:`FULL_COLD_START`,
+        the others are the milliseconds elapsed until the first valid sentence, the first valid UTC time
+        and the first fix (time to first fix), or *None* if not happened yet.
+
+        Return *None* if the L76 has never been started.
+
+        """
+        c = self._lastcycle
+        if c is None:
+            return None
+        return (c[0],c[2],c[3],c[4])
+
+    def ttff_stats(self):
+        """
+.. method:: ttff_stats()
+
+        Return the time to first fix statistics of every completed start or resume cycle, as a dictionary
+        mapping the kind of start (:samp:`HOT_START`, ...) to a tuple :samp:`(count, min, avg, max)` in milliseconds.
+
+        """
+        res = {}
+        for kind in self._ttffs:
+            st = self._ttffs[kind]
+            res[kind] = (st[0],st[1],st[3]/st[0],st[2])
+        return res
+
+    def profile(self,enable=True,clock=None):
+        """
+.. method:: profile(enable=True, clock=None)
+
+        Enable or disable timing of the receive path stages. When enabled, a new :class:`Profiler` is created,
+        stored in :samp:`profiler` and returned; the receiver thread then timestamps with *clock*
+        (default :samp:`timers.now`) the completion of each read, the start and end of each sentence parsing
+        and the publication of each fix.
+
+        """
+        if not enable:
+            self.profiler = None
+            return None
+        self.profiler = Profiler(clock)
+        return self.profiler
+
+    def subscribe(self,on_fix=None,on_utc=None,on_fix_lost=None):
+        """
+.. method:: subscribe(on_fix=None, on_utc=None, on_fix_lost=None)
+
+        Register callbacks invoked by the receiver thread every time a new pair of RMC and GGA sentences is received:
+
+            * *on_fix* is called with the new fix (same tuple as :ref:`fix`) when a fix is available
+            * *on_utc* is called with the current UTC time tuple when available
+            * *on_fix_lost* is called without arguments when a fix was available and it is not anymore
+
+        Callbacks run in the receiver thread and must return quickly. Passing *None* removes a callback.
+
+        """
+        self._on_fix = on_fix
+        self._on_utc = on_utc
+        self._on_fix_lost = on_fix_lost
+        self._epoch = 0
+        self._notify = on_fix is not None or on_utc is not None or on_fix_lost is not None or self.history is not None or self.controller is not None
+
+    def adapt_rate(self,enable=True,stationary=1000,moving=200,start_speed=5,stop_speed=2,samples=3):
+        """
+.. method:: adapt_rate(enable=True, stationary=1000, moving=200, start_speed=5, stop_speed=2, samples=3)
+
+        Enable or disable the automatic fix rate. When enabled, a new :class:`RateController` is created,
+        stored in :samp:`controller` and returned: the receiver thread feeds it the speed of every fix and sets
+        the fix period (PMTK220) to *stationary* milliseconds while still and to *moving* milliseconds while moving.
+
+        Moving starts when *samples* consecutive fixes are faster than *start_speed* Km/h and stops when *samples*
+        consecutive fixes are slower than *stop_speed* Km/h, so that speed noise around a threshold does not flip the rate.
+
+        The rate command is written by the receiver thread without waiting for its acknowledge: :ref:`set_rate`
+        can still be used, but the controller overrides it at its next switch.
+
+        """
+        if not enable:
+            self.controller = None
+        else:
+            self.controller = RateController(stationary,moving,start_speed,stop_speed,samples)
+        self._notify = self._on_fix is not None or self._on_utc is not None or self._on_fix_lost is not None or self.history is not None or self.controller is not None
+        return self.controller
+
+    def inject(self,position=None,utc=None,timeout=ACK_TIMEOUT):
+        """
+.. method:: inject(position=None, utc=None, timeout=ACK_TIMEOUT)
+
+        Give the L76 a reference position and UTC time so that it can compute a fix sooner.
+
+        *position* is a tuple :samp:`(latitude, longitude, altitude)` with coordinates in the same unit of :ref:`fix`
+        (decimal degrees, or integers in 1e-7 degrees if *fixed_point* is set) and altitude in meters; *utc* is a tuple :samp:`(yyyy,MM,dd,hh,mm,ss,...)`,
+        for example from an RTC.
+
+        If *utc* is *None*, the last UTC time received from the L76 advanced by the elapsed time is used, if any.
+        If *position* is given it is sent together with the time with PMTK741, otherwise only the time is sent with PMTK740.
+
+        Raises the same exceptions of :ref:`send`.
+
+        """
+        cmd = self._inject_command(position,utc,self.fixed_point)
+        self.send(cmd[0],cmd[1],timeout)
+
+    def load_epo(self,stream,timeout=ACK_TIMEOUT):
+        """
+.. method:: load_epo(stream, timeout=ACK_TIMEOUT)
+
+        Upload EPO assistance data (MTK EPO format, 72 bytes per satellite record) read from the file-like *stream*,
+        which can cut the time to first fix from tens of seconds to a few seconds.
+
+        The L76 is switched to the PMTK binary protocol (PMTK253) and the data is sent in packets of
+        :samp:`EPO_SATS_PER_PACKET` records (PMTK binary 722). Each packet is sent only after the previous one
+        has been acknowledged (PMTK binary 723); a packet is retried up to :samp:`EPO_RETRIES` times if its acknowledge
+        does not arrive within *timeout* milliseconds or reports a failure. The L76 is switched back to NMEA in any case.
+
+        Raises *TimeoutError* or *RuntimeError* if a packet cannot be delivered.
+
+        :returns: the number of satellite records uploaded.
+
+        """
+        if not self.running:
+            raise RuntimeError
+        if self.baud is None:
+            raise UnsupportedError
+        size = EPO_SATS_PER_PACKET*EPO_RECORD_SIZE
+        pkt = pmtk.binary(722,size+2)
+        records = 0
+        self._write(pmtk.command(253,1,0))
+        self._binmode = True
+        sleep(100)
+        try:
+            seq = 0
+            while True:
+                data = stream.read(size)
+                if not data:
+                    break
+                n = len(data)
+                pkt[8:8+n] = data
+                for i in range(8+n,8+size):
+                    pkt[i] = 0
+                self._epo_packet(pkt,seq,timeout)
+                records+=(n+EPO_RECORD_SIZE-1)//EPO_RECORD_SIZE
+                seq+=1
+            # end of data
+            for i in range(8,8+size):
+                pkt[i] = 0
+            self._epo_packet(pkt,0xffff,timeout)
+        finally:
+            # back to NMEA at the current baudrate
+            mode = pmtk.binary(253,5)
+            mode[6] = 0
+            for i in range(4):
+                mode[7+i] = (self.baud>>(8*i))&0xff
+            self._write(pmtk.seal(mode))
+            sleep(100)
+            self._binmode = False
+        return records
+
+    def epo_status(self,timeout=ACK_TIMEOUT):
+        """
+.. method:: epo_status(timeout=ACK_TIMEOUT)
+
+        Query the EPO data stored in the L76 (PMTK607). Return a tuple :samp:`(sets, first_week, first_tow, last_week, last_tow)`:
+        the number of 6 hours EPO sets and the GPS week and time of week (seconds) of the start of the first set and of the last one.
+        EPO data is valid while the current GPS time is before the end of the last set (:samp:`last_tow` plus 6 hours);
+        *sets* is 0 if no EPO data is stored.
+
+        Raises *TimeoutError* if the L76 does not answer within *timeout* milliseconds.
+
+        """
+        # $PMTK707,set,fwn,ftow,lwn,ltow,fcwn,fctow,lcwn,lctow
+        line = self._query(607,707,timeout)
+        res = []
+        pos = line.find(b",")+1
+        stop = line.find(b"*")
+        while len(res)<5:
+            c = line.find(b",",pos,stop)
+            if c<0:
+                c = stop
+            v = _decimal(line,pos,c,0)
+            res.append(v if v is not None else 0)
+            pos = c+1
+        return tuple(res)
+
+    def feed(self,data):
+        """
+.. method:: feed(data)
+
+        Process *data* received from the L76 by other means than the receiver thread, which must not be running:
+        the bytes go through the same framing and parsing of the receiver thread, callbacks included.
+
+        :returns: *True* once a valid sentence has been received since the last start or resume.
+
+        """
+        n = len(data)
+        pos = 0
+        prof = self.profiler
+        if prof is not None:
+            self._tread = prof.clock()
+        while pos<n:
+            # framing leaves at most MAX_LINE bytes pending
+            size = RXBUF_SIZE-self._rxlen
+            if size>n-pos:
+                size = n-pos
+            self._rx[self._rxlen:self._rxlen+size] = data[pos:pos+size]
+            self._rxlen+=size
+            self._nbytes+=size
+            pos+=size
+            self._frame()
+        return self._woke
+
+    def send(self,num,args=(),timeout=ACK_TIMEOUT):
+        """
+.. method:: send(num, args=(), timeout=ACK_TIMEOUT)
+
+        Send the PMTK command number *num* with parameters *args* and wait for its PMTK001 acknowledge,
+        routed back by the receiver thread. Returns as soon as the acknowledge arrives.
+
+        Raises *TimeoutError* if no acknowledge is received within *timeout* milliseconds,
+        *ValueError* if the L76 reports an invalid command, *UnsupportedError* if the command is not supported
+        and *RuntimeError* if the command failed.
+
+        """
+        if not self.running:
+            raise RuntimeError
+        pending = self._command(num,args,threading.Event())
+        pending[0].wait(timeout)
+        self._acked(num,args,pending)
+
+    def set_baud(self,baud=115200,timeout=2000):
+        """
+.. method:: set_baud(baud=115200, timeout=2000)
+
+        Change the baudrate of the L76 with PMTK251 and reopen the serial port at the new speed.
+        The new baudrate is verified by waiting up to *timeout* milliseconds for a sentence with a valid checksum;
+        if none arrives, the previous baudrate is restored on both sides.
+
+        The L76 keeps the new baudrate until a hardware reset or power cycle.
+
+        :returns: *True* if the new baudrate is active, *False* if the previous one has been restored.
+
+        """
+        if not self.running:
+            raise RuntimeError
+        if self.baud is None:
+            raise UnsupportedError
+        if baud==self.baud:
+            return True
+        prev = self.baud
+        # no sentences while a periodic mode sleeps
+        timeout+=self._quiet()
+        self._write(pmtk.command(251,baud))
+        sleep(100)
+        if self._switch_baud(baud,timeout):
+            return True
+        # fall back: ask the chip to go back in case it switched but was not heard
+        self._write(pmtk.command(251,prev))
+        sleep(100)
+        self._switch_baud(prev,timeout)
+        return False
+
+    ##################### Private
+
+    def _save_hint(self):
+        # remember the last fix and when it was taken, to be injected at the next start/resume
+        self._fixlock.acquire()
+        if self._has_fix():
+            rmc = self._rmc
+            self._hint = (rmc.coord(3),rmc.coord(5),self._gga.decimal(9,2),self._utc_tuple(),timers.now())
+        self._fixlock.release()
+
+    def _hint_args(self):
+        # (position in 1e-7 degrees, utc) to inject at start/resume, or None
+        if not self.hints or self._hint is None:
+            return None
+        h = self._hint
+        alt = h[2]/100 if h[2] is not None else 0
+        utc = h[3]
+        if utc is not None:
+            utc = _utc(_seconds(utc)+(timers.now()-h[4])//1000)
+        return ((h[0],h[1],alt),utc)
+
+    def _inject_command(self,position,utc,fixed_point):
+        # PMTK741 (position and time) or PMTK740 (time) number and parameters
+        if utc is None:
+            utc = self._utc_now()
+            if utc is None:
+                raise ValueError
+        if position is None:
+            return (740,(utc[0],utc[1],utc[2],utc[3],utc[4],utc[5]))
+        lat = position[0]
+        lon = position[1]
+        if not fixed_point:
+            lat = _scale(lat,10000000)
+            lon = _scale(lon,10000000)
+        return (741,(_fixed(lat,7),_fixed(lon,7),_fixed(_scale(position[2],100),2),utc[0],utc[1],utc[2],utc[3],utc[4],utc[5]))
+
+    def _utc_now(self):
+        # last UTC received, advanced by the time elapsed since it was received
+        self._fixlock.acquire()
+        utc = self._utc_tuple()
+        self._fixlock.release()
+        if utc is None or self._heard is None:
+            return None
+        return _utc(_seconds(utc)+(timers.now()-self._heard)//1000)
+
+    def _wake_send(self,num,args=(),timeout=ACK_TIMEOUT):
+        first,retry = self._wake_timeouts(timeout)
+        try:
+            self.send(num,args,first)
+            return
+        except TimeoutError as e:
+            if retry is None:
+                raise e
+        self.send(num,args,retry)
+
+    def _wake_timeouts(self,timeout):
+        # (first, retry) timeouts of a command in the current power mode, retry None if it is sent once.
+        # In a low power mode the first command may only wake the L76 up: it is sent again if not acknowledged,
+        # after a short wait only if the L76 is silent. While it talks, the acknowledge may be queued behind
+        # the output on the wire: a short wait would repeat commands that worked (a PMTK161 would reach a chip in standby)
+        if self._power[0]==POWER_NORMAL:
+            return (timeout,None)
+        timeout+=self._wire_time(UART_BACKLOG)
+        if self._silent():
+            return (WAKE_TIMEOUT if timeout>WAKE_TIMEOUT else timeout,timeout)
+        return (timeout,timeout)
+
+    def _silent(self):
+        # no sentence for a fix period
+        return self._heard is None or timers.now()-self._heard>self._rate
+
+    def _wire_time(self,size):
+        # time to send size bytes at the current baudrate, 10 bits per byte (milliseconds)
+        if self.baud is None:
+            return 0
+        return size*10000//self.baud
+
+    def _command(self,num,args,event):
+        # write PMTK<num> and register event to be set by its acknowledge: [event, flag]
+        pending = [event,-1]
+        self._acks[num] = pending
+        try:
+            self._write(pmtk.command(num,*args))
+        except Exception as e:
+            self._acks.pop(num,None)
+            raise e
+        return pending
+
+    def _acked(self,num,args,pending):
+        # end of a command registered by _command: raise on failure, keep track of the settings it changed
+        self._acks.pop(num,None)
+        _check_ack(pending[1])
+        if num==220:
+            self._rate = args[0]
+        elif num==225:
+            self._power = args if len(args)==5 else (args[0],0,0,0,0)
+
+    def _quiet(self):
+        # longest expected silence besides the fix period (milliseconds)
+        p = self._power
+        if p[0]==POWER_PERIODIC:
+            return p[2] if p[2]>p[4] else p[4]
+        return 0
+
+    def _stale(self):
+        # no sentence for longer than expected in the active power mode
+        if not self.talking or self._heard is None or self._power[0]==POWER_ALWAYSLOCATE:
+            return False
+        return timers.now()-self._heard>STALE_PERIODS*self._rate+self._quiet()
+
+    def _query(self,num,reply,timeout):
+        # send PMTK<num> and return the PMTK<reply> sentence routed back by the receiver thread
+        if not self.running:
+            raise RuntimeError
+        pending = [threading.Event(),None]
+        self._replies[reply] = pending
+        try:
+            self._write(pmtk.command(num))
+            pending[0].wait(timeout)
+        finally:
+            self._replies.pop(reply,None)
+        if pending[1] is None:
+            raise TimeoutError
+        return pending[1]
+
+    def _epo_packet(self,pkt,seq,timeout):
+        pkt[6] = seq&0xff
+        pkt[7] = seq>>8
+        pmtk.seal(pkt)
+        for i in range(EPO_RETRIES):
+            pending = [threading.Event(),seq,-1]
+            self._binack = pending
+            self._write(pkt)
+            pending[0].wait(timeout)
+            self._binack = None
+            if pending[2]==1:
+                return
+        if pending[2]<0:
+            raise TimeoutError
+        raise RuntimeError
+
+    def _switch_baud(self,baud,timeout):
+        # the receiver thread reopens the port between reads
+        self._newbaud = baud
+        while self._newbaud is not None and self.running:
+            sleep(10)
+        self._alive.wait(timeout)
+        return self._woke
+
+    def _write(self,data):
+        # commands come from the application and from the receiver thread: never interleave them.
+        # On half duplex links the receiver thread writes them between reads
+        self._wlock.acquire()
+        try:
+            if self._queued:
+                self._cmdq.append(data)
+            else:
+                self.transport.write(data)
+        finally:
+            self._wlock.release()
+
+    def _drain(self):
+        self._wlock.acquire()
+        try:
+            while self._cmdq:
+                self.transport.write(self._cmdq.pop(0))
+        finally:
+            self._wlock.release()
+
+    def _set_baud(self,baud):
+        # reopen the link at baud, without writes in between
+        self._wlock.acquire()
+        try:
+            self.baud = baud
+            self.transport.set_baud(baud)
+        finally:
+            self._wlock.release()
+
+    def _expect(self):
+        # arm the first sentence event, set by the receiver thread on the next valid sentence
+        self._woke = False
+        self._alive.clear()
+
+    def _flush(self,idle=0):
+        # drop whatever was received before a restart (receiver thread not running)
+        # and, with idle, what arrives until the link stays silent for idle milliseconds
+        self._rxlen = 0
+        total = 0
+        t = timers.now()
+        while total<4*RXBUF_SIZE:
+            size = self.transport.available()
+            if size<=0:
+                if timers.now()-t>=idle:
+                    break
+                sleep(5)
+                continue
+            if size>RXBUF_SIZE:
+                size = RXBUF_SIZE
+            got = self.transport.readinto(self._rxv[0:size])
+            if got is None or got<=0:
+                break
+            total+=got
+            t = timers.now()
+
+    def _start_begin(self,mode):
+        # start() up to the receiver thread: returns the actual mode and whether the reset pin must be pulsed
+        if mode==AUTO_START:
+            mode = self._start_policy()
+        if mode<HOT_START or mode>FULL_COLD_START:
+            raise ValueError
+        reset = mode==FULL_COLD_START and self.rstpin is not None
+        if reset and self.baud!=self.default_baud:
+            # a hardware reset brings the L76 back to its power-on baudrate
+            self._set_baud(self.default_baud)
+
+        self._flush()
+        self._expect()
+        self._begin_cycle(mode)
+        if mode==FULL_COLD_START:
+            # factory settings: default fix period
+            self._rate = 1000
+        if not reset:
+            self._write(_START_COMMANDS[mode])
+            if mode==FULL_COLD_START and self.baud!=self.default_baud:
+                # factory settings: back to the power-on baudrate
+                self._set_baud(self.default_baud)
+
+        self.enable(True)
+        self._halt = False
+        self.running = True
+        self.talking = True
+        return (mode,reset)
+
+    def _reset_pulse(self):
+        digitalWrite(self.rstpin,self.rstval)
+        sleep(100)
+        digitalWrite(self.rstpin,HIGH^ self.rstval)
+
+    def _resume_begin(self):
+        # resume() up to the wait for the first sentence
+        self._expect()
+        self._begin_cycle(HOT_START)
+        self._write(pmtk.HOT_START)
+        self.enable(True)
+        self.talking = True
+
+    def _pause_end(self):
+        self.talking = False
+        self.enable(False)
+
+    def _stop_begin(self):
+        self._save_hint()
+        # the receiver thread stops reading once it routes the acknowledge: the chip will be silent
+        self._halt = True
+
+    def _stop_end(self,stopped):
+        # after the standby command of stop(): acknowledged or failed
+        if not stopped:
+            self._halt = False
+            return
+        self.running = False
+        self.talking = False
+        self.enable(False)
+
+    def _link_lost(self):
+        # the link ended while running (not by stop()): returns True if the L76 is now stopped
+        if not self.running or self._halt:
+            return False
+        self.running = False
+        self.talking = False
+        return True
+
+    def _loop_error(self,e):
+        self._nexc+=1
+        if self.talking:
+            self.print_d("L76 loop", e)
+
+    def _restore_commands(self,output,hint):
+        # commands to send once the L76 is running again: (num, args, label).
+        # Output sentences after start() (resume keeps them), the hint after hot/warm starts and resume
+        # (cold starts discard time and position on purpose) and the low power mode
+        cmds = []
+        if output and self.sentences is not None:
+            cmds.append((314,self._output_fields(),"output"))
+        h = self._hint_args() if hint else None
+        if h is not None:
+            try:
+                cmd = self._inject_command(h[0],h[1],True)
+                cmds.append((cmd[0],cmd[1],"hint"))
+            except Exception as e:
+                self.print_d("L76 hint", e)
+        if self._power[0]!=POWER_NORMAL:
+            cmds.append((225,_power_args(self._power),"power"))
+        return cmds
+
+    def _restore(self,cmds):
+        # the receiver thread is already running: a missing acknowledge must not abort start() or resume()
+        for cmd in cmds:
+            try:
+                self.send(cmd[0],cmd[1])
+            except Exception as e:
+                self.print_d("L76 "+cmd[2], e)
+
+    def _output_fields(self):
+        # PMTK314: one output frequency field per sentence type, 1 means every fix
+        fields = [0]*19
+        for i in range(len(NMEA_TYPES)):
+            if NMEA_TYPES[i] in self.sentences:
+                fields[i] = 1
+        if "ZDA" in self.sentences:
+            fields[17] = 1
+        return fields
+
+    def _run(self):
+        self._rxlen = 0
+        self._queued = not self.transport.duplex
 
         while self.running:
             try:
-                chs = nmea.readline(self.ifc,buffer)
-                if self.debug:
-                    self.print_d(buffer[:buffer.find(b'\0')])
-                if not self.talking:
-                    continue
-                if chs>=1:
-                    self.parse(buffer, chs)
-                else:
-                    self.print_d("L76 check",chs)
+                if self._cmdq:
+                    self._drain()
+                if self._newbaud is not None:
+                    self._set_baud(self._newbaud)
+                    self._rxlen = 0
+                    self._expect()
+                    self._newbaud = None
+                self._receive()
             except Exception as e:
-                if self.talking:
-                    self.print_d("L76 loop", e)
+                self._loop_error(e)
 
-        if self.mode==SERIAL:
-            self.drv.close()
+        # from now on commands are written by the caller
+        self._wlock.acquire()
+        self._queued = False
+        self._wlock.release()
+        self._drain()
         self.th = None
+
+    def _receive(self):
+        # read in bulk whatever is available (at least one byte, blocking)
+        # at the end of the receive buffer, then frame complete lines in place
+        n = self._rxlen
+        size = self.transport.available()
+        if size<=0:
+            size = 1
+        if size>RXBUF_SIZE-n:
+            size = RXBUF_SIZE-n
+        prof = self.profiler
+        if prof is not None:
+            t0 = prof.clock()
+        got = self.transport.readinto(self._rxv[n:n+size])
+        if prof is not None:
+            self._tread = prof.clock()
+            prof.wait.add(self._tread-t0)
+        if got is None or got<=0:
+            return
+        self._nbytes+=got
+        self._rxlen = n+got
+        self._frame()
+
+    def _frame(self):
+        if self._binmode:
+            self._frame_binary()
+            return
+        rx = self._rx
+        end = self._rxlen
+        pos = 0
+        while True:
+            start = rx.find(b"$",pos,end)
+            if start<0:
+                # no sentence start: everything up to end is garbage
+                pos = end
+                break
+            stop = rx.find(b"\n",start,end)
+            if stop<0:
+                # partial sentence: keep it for the next read
+                pos = start
+                break
+            pos = stop+1
+            if rx[stop-1]==0x0d:
+                stop-=1
+            if stop-start>MAX_LINE:
+                self._noverflow+=1
+                continue
+            self._sentence(start,stop)
+
+        left = end-pos
+        if left<=0 or left>MAX_LINE:
+            # nothing pending or runaway line without terminator: drop it
+            if left>0:
+                self._noverflow+=1
+            self._rxlen = 0
+        else:
+            if pos>0:
+                rx[0:left] = self._rxv[pos:end]
+            self._rxlen = left
+
+    def _frame_binary(self):
+        # binary protocol: 0x04 0x24, 16 bits length of the whole packet, command, payload, checksum, \r\n
+        rx = self._rx
+        end = self._rxlen
+        pos = 0
+        while True:
+            start = rx.find(b"\x04\x24",pos,end)
+            if start<0:
+                pos = end-1 if end>0 and rx[end-1]==0x04 else end
+                break
+            if end-start<4:
+                pos = start
+                break
+            size = rx[start+2]|(rx[start+3]<<8)
+            if size<9 or size>MAX_LINE:
+                pos = start+2
+                continue
+            if end-start<size:
+                pos = start
+                break
+            pos = start+size
+            self._packet(start,size)
+        left = end-pos
+        if left>0 and pos>0:
+            rx[0:left] = self._rxv[pos:end]
+        self._rxlen = left if left>0 else 0
+
+    def _packet(self,start,size):
+        rx = self._rx
+        crc = 0
+        for i in range(start+2,start+size-3):
+            crc^=rx[i]
+        if crc!=rx[start+size-3]:
+            self._nchs+=1
+            return
+        cmd = rx[start+4]|(rx[start+5]<<8)
+        pending = self._binack
+        if cmd==723 and pending is not None and size>=12:
+            # EPO acknowledge: sequence, result
+            if rx[start+6]|(rx[start+7]<<8)==pending[1]:
+                pending[2] = rx[start+8]
+                pending[0].set()
+
+    def _sentence(self,start,stop):
+        line = self._rxv[start:stop]
+        if self.debug:
+            self.print_d(bytes(line))
+        rx = self._rx
+        if rx[start+1]==0x50 and self._acks and self._rxv[start+2:start+9]==b"MTK001,":
+            # acknowledge for a pending command: route it back even when not talking
+            if self._checksum(start,stop)>=1:
+                self._ack(start+9,stop)
+            return
+        if rx[start+1]==0x50 and self._replies and self._rxv[start+2:start+5]==b"MTK" and stop-start>8:
+            # reply to a pending query
+            num = (rx[start+5]-0x30)*100+(rx[start+6]-0x30)*10+rx[start+7]-0x30
+            pending = self._replies.get(num)
+            if pending is not None and self._checksum(start,stop)>=1:
+                pending[1] = bytes(line)
+                pending[0].set()
+                return
+        if not self.talking:
+            return
+        if self._accept is not None and rx[start+1]!=0x50:
+            # short-circuit unwanted types on the $ttSSS prefix (proprietary $P... always pass)
+            if stop-start<6 or _typekey(rx[start+3],rx[start+4],rx[start+5]) not in self._accept:
+                self._nfiltered+=1
+                return
+        prof = self.profiler
+        if prof is not None:
+            t0 = prof.clock()
+            prof.queue.add(t0-self._tread)
+        chs = self._checksum(start,stop)
+        if chs>=1:
+            # proprietary $P... replies do not tell that the chip is running
+            proprietary = rx[start+1]==0x50
+            if not self._woke and not proprietary:
+                self._woke = True
+                self._alive.set()
+            self._last = self._heard = timers.now()
+            key = _typekey(rx[start+3],rx[start+4],rx[start+5])
+            if proprietary:
+                self._nprop+=1
+            else:
+                self._types[key] = self._types.get(key,0)+1
+            if key==_RMC:
+                self._store(self._rmc,start,stop,10)
+                if self._rmc.char(2)==0x41:
+                    self._fixtime = timers.now()
+            elif key==_GGA:
+                self._store(self._gga,start,stop,10)
+            elif key==_GSA:
+                self._store(self._gsa,start,stop,18)
+            else:
+                self.parse(line,chs)
+            if prof is not None:
+                self._tparsed = prof.clock()
+                prof.parse.add(self._tparsed-t0)
+            if self._cycle is not None and not proprietary:
+                self._track(key)
+            if self._notify:
+                if key==_RMC:
+                    self._epoch|=1
+                elif key==_GGA:
+                    self._epoch|=2
+                if self._epoch==3:
+                    self._epoch = 0
+                    self._publish()
+        else:
+            self._nchs+=1
+            self.print_d("L76 check",chs)
+
+    def _publish(self):
+        # a RMC/GGA pair has been parsed: record the fix and notify subscribers
+        try:
+            if self.has_fix():
+                self._hadfix = True
+                if self.history is not None:
+                    self._record()
+                if self._on_fix is not None:
+                    self._on_fix(self.fix())
+            elif self._hadfix:
+                self._hadfix = False
+                if self._on_fix_lost is not None:
+                    self._on_fix_lost()
+            if self._on_utc is not None and self.has_utc():
+                self._on_utc(self.utc())
+        except Exception as e:
+            self.print_d("L76 callback", e)
+        if self.controller is not None:
+            self._adapt(self.controller)
+        prof = self.profiler
+        if prof is not None:
+            t = prof.clock()
+            prof.publish.add(t-self._tparsed)
+            prof.latency.add(t-self._tread)
+
+    def _adapt(self,ctl):
+        # runs in the receiver thread: write PMTK220 without waiting for the acknowledge it would have to route
+        self._fixlock.acquire()
+        speed = self._rmc.decimal(7,3) if self._has_fix() else None
+        self._fixlock.release()
+        rate = ctl.update(speed)
+        if rate!=self._rate and self.talking:
+            self._write(pmtk.command(220,rate))
+            self._rate = rate
+
+    def _start_policy(self):
+        # hot start whenever the chip may still hold valid ephemeris
+        if self._fixtime is not None and timers.now()-self._fixtime>EPHEMERIS_VALIDITY:
+            return WARM_START
+        return HOT_START
+
+    def _begin_cycle(self,kind):
+        # kind, start time, ms to first sentence, to first utc, to first fix
+        self._cycle = [kind,timers.now(),None,None,None]
+        self._lastcycle = self._cycle
+
+    def _track(self,key):
+        cycle = self._cycle
+        t = timers.now()-cycle[1]
+        if cycle[2] is None:
+            cycle[2] = t
+        if key!=_RMC and key!=_GGA:
+            return
+        if cycle[3] is None and self.has_utc():
+            cycle[3] = t
+        if cycle[4] is None and self.has_fix():
+            cycle[4] = t
+            self._cycle = None
+            # count, min, max, total
+            st = self._ttffs.get(cycle[0])
+            if st is None:
+                self._ttffs[cycle[0]] = [1,t,t,t]
+            else:
+                st[0]+=1
+                st[3]+=t
+                if t<st[1]:
+                    st[1] = t
+                if t>st[2]:
+                    st[2] = t
+
+    def _reset_stats(self):
+        self._nbytes = 0
+        self._types = {}
+        self._nprop = 0
+        self._nfiltered = 0
+        self._nchs = 0
+        self._noverflow = 0
+        self._nexc = 0
+        self._last = None
+
+    def _record(self):
+        # store the current fix in the history without going through floats
+        self._fixlock.acquire()
+        rmc = self._rmc
+        speed = rmc.decimal(7,3)
+        if speed is not None:
+            # thousandths of knot to 0.1 Km/h
+            speed = (speed*1852+50000)//100000
+        self.history.add(rmc.coord(3),rmc.coord(5),self._gga.decimal(9,2),speed,rmc.decimal(8,2),
+            self._gga.decimal(7,0) or 0,self._hdop(),self._gsa.decimal(17,2),self._gsa.decimal(15,2),
+            _seconds(self._utc_tuple()))
+        self._fixlock.release()
+
+    def _store(self,slot,start,stop,fields):
+        # keep the raw sentence: fields are decoded on first access
+        self._fixlock.acquire()
+        slot.store(self._rxv[start:stop],fields)
+        self._fixlock.release()
+
+    def _has_fix(self):
+        rmc = self._rmc
+        return rmc.char(2)==0x41 and (self._gga.decimal(6,0) or 0)>0 and rmc.coord(3) is not None and rmc.coord(5) is not None
+
+    def _hdop(self):
+        hdop = self._gga.decimal(8,2)
+        if hdop is None:
+            hdop = self._gsa.decimal(16,2)
+        return hdop
+
+    def _utc_tuple(self):
+        date = self._rmc.ddmmyy(9)
+        time = self._rmc.hhmmss(1)
+        if date is None or time is None:
+            return None
+        return date+time
+
+    def _ack(self,pos,stop):
+        # PMTK001,<cmd>,<flag>: wake up the waiter of <cmd>
+        rx = self._rx
+        num = 0
+        while pos<stop and rx[pos]!=0x2c:
+            num = num*10+rx[pos]-0x30
+            pos+=1
+        pending = self._acks.get(num)
+        if num==161 and self._halt:
+            # stop(): nothing else will be received, leave _run before blocking on a read
+            self.running = False
+        if pending is not None and pos+1<stop:
+            pending[1] = rx[pos+1]-0x30
+            pending[0].set()
+
+    def _checksum(self,start,stop):
+        # validate $...*hh in place; returns the sentence length on success,
+        # -1 if the sentence is malformed, -2 on checksum mismatch
+        rx = self._rx
+        star = rx.find(b"*",start,stop)
+        if star<0 or stop-star<3:
+            return -1
+        hi = _hexval(rx[star+1])
+        lo = _hexval(rx[star+2])
+        if hi<0 or lo<0:
+            return -1
+        crc = 0
+        for i in range(start+1,star):
+            crc^=rx[i]
+        if crc!=(hi<<4)|lo:
+            return -2
+        return stop-start
+
+
+class _Sentence():
+    # raw copy of the latest sentence of a type with the offsets of its fields:
+    # field k is buf[fpos[k]:fpos[k+1]-1]. Fields are decoded on first access
+    # and the decoded value is cached until the next sentence is stored
+
+    def __init__(self):
+        self.buf = bytearray(MAX_SENTENCE)
+        self.fpos = [0]*(MAX_FIELDS+1)
+        self.n = 0
+        self.cache = {}
+
+    def store(self,line,fields):
+        self.cache.clear()
+        self.n = 0
+        size = len(line)
+        if size>MAX_SENTENCE:
+            return
+        buf = self.buf
+        buf[0:size] = line
+        star = buf.find(b"*",0,size)
+        fpos = self.fpos
+        fpos[0] = 0
+        n = 0
+        pos = 0
+        while n<MAX_FIELDS-1:
+            c = buf.find(b",",pos,star)
+            if c<0:
+                break
+            n+=1
+            pos = c+1
+            fpos[n] = pos
+        n+=1
+        fpos[n] = star+1
+        if n>=fields:
+            self.n = n
+
+    def char(self,k):
+        if k>=self.n or self.fpos[k+1]-1==self.fpos[k]:
+            return 0
+        return self.buf[self.fpos[k]]
+
+    def decimal(self,k,digits):
+        cache = self.cache
+        if k in cache:
+            return cache[k]
+        v = None
+        if k<self.n:
+            v = _decimal(self.buf,self.fpos[k],self.fpos[k+1]-1,digits)
+        cache[k] = v
+        return v
+
+    def coord(self,k):
+        # field k+1 is the hemisphere
+        cache = self.cache
+        if k in cache:
+            return cache[k]
+        v = None
+        if k+1<self.n:
+            hemi = self.char(k+1)
+            v = _coord(self.buf,self.fpos[k],self.fpos[k+1]-1,hemi==0x53 or hemi==0x57)
+        cache[k] = v
+        return v
+
+    def hhmmss(self,k):
+        cache = self.cache
+        if k in cache:
+            return cache[k]
+        v = None
+        if k<self.n:
+            v = _hhmmss(self.buf,self.fpos[k],self.fpos[k+1]-1)
+        cache[k] = v
+        return v
+
+    def ddmmyy(self,k):
+        cache = self.cache
+        if k in cache:
+            return cache[k]
+        v = None
+        if k<self.n:
+            v = _ddmmyy(self.buf,self.fpos[k],self.fpos[k+1]-1)
+        cache[k] = v
+        return v
+
+
+class RateController():
+    """
+.. class:: RateController(stationary=1000, moving=200, start_speed=5, stop_speed=2, samples=3)
+
+    Fix period selection with hysteresis, created by :meth:`L76.adapt_rate`.
+    Periods are in milliseconds (100-10000), speeds in Km/h; *stop_speed* must not exceed *start_speed*.
+
+    The attribute :samp:`moving` tells the current state, :samp:`switches` counts the state changes.
+
+    """
+
+    def __init__(self,stationary=1000,moving=200,start_speed=5,stop_speed=2,samples=3):
+        if stationary<100 or stationary>10000 or moving<100 or moving>10000 or stop_speed>start_speed or samples<1:
+            raise ValueError
+        self.stationary = stationary
+        self.fast = moving
+        # Km/h to thousandths of knot
+        self._start = _scale(start_speed,1000000)//1852
+        self._stop = _scale(stop_speed,1000000)//1852
+        self.samples = samples
+        self.moving = False
+        self.switches = 0
+        self._count = 0
+
+    def update(self,speed):
+        """
+.. method:: update(speed)
+
+        Feed the *speed* of a fix in thousandths of knot (*None* if no fix) and return the fix period to use.
+
+        """
+        if speed is not None:
+            if self.moving:
+                crossed = speed<self._stop
+            else:
+                crossed = speed>self._start
+            if crossed:
+                self._count+=1
+                if self._count>=self.samples:
+                    self.moving = not self.moving
+                    self.switches+=1
+                    self._count = 0
+            else:
+                self._count = 0
+        return self.fast if self.moving else self.stationary
+
+
+class Stage():
+    """
+.. class:: Stage(buckets)
+
+    Durations of a receive path stage: count, min, max, total and a histogram.
+    *buckets* is a tuple of increasing upper bounds; :samp:`histogram[i]` counts durations up to :samp:`buckets[i]`,
+    the last element counts the longer ones.
+
+    """
+
+    def __init__(self,buckets):
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        """
+.. method:: reset()
+
+        Clear the collected durations.
+
+        """
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.histogram = [0]*(len(self.buckets)+1)
+
+    def add(self,d):
+        """
+.. method:: add(d)
+
+        Collect the duration *d*.
+
+        """
+        self.count+=1
+        self.total+=d
+        if self.min is None or d<self.min:
+            self.min = d
+        if self.max is None or d>self.max:
+            self.max = d
+        i = 0
+        for b in self.buckets:
+            if d<=b:
+                break
+            i+=1
+        self.histogram[i]+=1
+
+    def avg(self):
+        """
+.. method:: avg()
+
+        Return the average duration, *None* if nothing has been collected.
+
+        """
+        if not self.count:
+            return None
+        return self.total/self.count
+
+
+class Profiler():
+    """
+.. class:: Profiler(clock=None, buckets=PROFILE_BUCKETS)
+
+    Per-stage timings of the L76 receive path, created by :meth:`L76.profile`. Each attribute is a :class:`Stage`:
+
+        * :samp:`wait`: time spent in the driver read, i.e. waiting for the UART
+        * :samp:`queue`: from the completion of a read to the start of the parsing of each sentence it completed
+        * :samp:`parse`: checksum, decoding and dispatch of a sentence
+        * :samp:`publish`: from the end of the parsing of a RMC/GGA pair to the publication of the fix (lock contention and callbacks)
+        * :samp:`latency`: from the read completing a RMC/GGA pair to the publication of the fix
+
+    Durations are in units of *clock* (default :samp:`timers.now`, milliseconds).
+
+    """
+
+    def __init__(self,clock=None,buckets=None):
+        self.clock = clock if clock is not None else timers.now
+        if buckets is None:
+            buckets = PROFILE_BUCKETS
+        self.wait = Stage(buckets)
+        self.queue = Stage(buckets)
+        self.parse = Stage(buckets)
+        self.publish = Stage(buckets)
+        self.latency = Stage(buckets)
+
+    def reset(self):
+        """
+.. method:: reset()
+
+        Clear every stage.
+
+        """
+        for st in (self.wait,self.queue,self.parse,self.publish,self.latency):
+            st.reset()
+
+    def report(self):
+        """
+.. method:: report()
+
+        Return a dictionary mapping each stage name to a tuple :samp:`(count, min, avg, max, histogram)`.
+
+        """
+        res = {}
+        for name,st in (("wait",self.wait),("queue",self.queue),("parse",self.parse),("publish",self.publish),("latency",self.latency)):
+            res[name] = (st.count,st.min,st.avg(),st.max,st.histogram)
+        return res
+
+
+class FixHistory():
+    """
+.. class:: FixHistory(size)
+
+    Bounded history of the last *size* fixes, stored in preallocated parallel arrays instead of lists of tuples
+    (27 bytes per fix). When full, the oldest fix is overwritten.
+
+    Fixes are stored as scaled integers:
+
+        * latitude and longitude in 1e-7 degrees
+        * altitude in centimeters
+        * speed in 0.1 Km/h
+        * course in 0.01 degrees
+        * number of satellites
+        * horizontal, vertical and positional dilution of precision in 0.01 units
+        * UTC timestamp in seconds since 2000-01-01 00:00:00
+
+    A :class:`L76` created with a non zero *history* feeds its instance (:samp:`gnss.history`) from the receiver thread.
+    The history can be iterated from the oldest to the newest fix; each item is a tuple of the scaled values above.
+
+    """
+
+    def __init__(self,size):
+        if size<=0:
+            raise ValueError
+        self.size = size
+        self.lat = bytearray(4*size)
+        self.lon = bytearray(4*size)
+        self.alt = bytearray(4*size)
+        self.speed = bytearray(2*size)
+        self.course = bytearray(2*size)
+        self.sats = bytearray(size)
+        self.hdop = bytearray(2*size)
+        self.vdop = bytearray(2*size)
+        self.pdop = bytearray(2*size)
+        self.timestamp = bytearray(4*size)
+        self.count = 0
+        self.head = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return _FixHistoryIterator(self)
+
+    def clear(self):
+        """
+.. method:: clear()
+
+        Remove every fix from the history.
+
+        """
+        self.count = 0
+        self.head = 0
+
+    def append(self,fix,fixed_point=False):
+        """
+.. method:: append(fix, fixed_point=False)
+
+        Store *fix*, a tuple as returned by :meth:`L76.fix`: latitude and longitude are decimal degrees,
+        or integers in 1e-7 degrees if *fixed_point* is *True*.
+
+        """
+        lat = fix[0]
+        lon = fix[1]
+        if not fixed_point:
+            # decimal degrees
+            lat = _scale(lat,10000000)
+            lon = _scale(lon,10000000)
+        self.add(lat,lon,_scale(fix[2],100),_scale(fix[3],10),_scale(fix[4],100),fix[5],
+            _scale(fix[6],100),_scale(fix[7],100),_scale(fix[8],100),_seconds(fix[9]))
+
+    def add(self,lat,lon,alt,speed,course,sats,hdop,vdop,pdop,timestamp):
+        """
+.. method:: add(lat, lon, alt, speed, course, sats, hdop, vdop, pdop, timestamp)
+
+        Store a fix given as scaled integers (see above). *None* values are stored as 0.
+
+        """
+        i = self.head
+        _put(self.lat,i,4,lat)
+        _put(self.lon,i,4,lon)
+        _put(self.alt,i,4,alt)
+        _put(self.speed,i,2,speed)
+        _put(self.course,i,2,course)
+        self.sats[i] = sats&0xff
+        _put(self.hdop,i,2,hdop)
+        _put(self.vdop,i,2,vdop)
+        _put(self.pdop,i,2,pdop)
+        _put(self.timestamp,i,4,timestamp)
+        self.head = (i+1)%self.size
+        if self.count<self.size:
+            self.count+=1
+
+    def get(self,n):
+        """
+.. method:: get(n)
+
+        Return the *n*-th stored fix as a tuple of scaled integers, 0 being the oldest and -1 the newest.
+
+        """
+        if n<0:
+            n+=self.count
+        if n<0 or n>=self.count:
+            raise IndexError
+        i = (self.head-self.count+n)%self.size
+        return (
+            _get(self.lat,i,4,True),
+            _get(self.lon,i,4,True),
+            _get(self.alt,i,4,True),
+            _get(self.speed,i,2,False),
+            _get(self.course,i,2,False),
+            self.sats[i],
+            _get(self.hdop,i,2,False),
+            _get(self.vdop,i,2,False),
+            _get(self.pdop,i,2,False),
+            _get(self.timestamp,i,4,False)
+        )
+
+    def export(self,field):
+        """
+.. method:: export(field)
+
+        Return a copy of a whole column of the history in a single bytearray, from the oldest to the newest fix.
+        *field* is one of :samp:`"lat"`, :samp:`"lon"`, :samp:`"alt"`, :samp:`"speed"`, :samp:`"course"`, :samp:`"sats"`,
+        :samp:`"hdop"`, :samp:`"vdop"`, :samp:`"pdop"`, :samp:`"timestamp"`; values are little endian, with the sizes and units above.
+
+        """
+        if field not in _HISTORY_FIELDS:
+            raise ValueError
+        col = getattr(self,field)
+        width = len(col)//self.size
+        start = (self.head-self.count)%self.size
+        out = bytearray(self.count*width)
+        first = min(self.count,self.size-start)*width
+        out[0:first] = col[start*width:start*width+first]
+        out[first:] = col[0:len(out)-first]
+        return out
+
+
+class _FixHistoryIterator():
+
+    def __init__(self,history):
+        self.history = history
+        self.n = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.n>=self.history.count:
+            raise StopIteration
+        self.n+=1
+        return self.history.get(self.n-1)
+
+
+_HISTORY_FIELDS = ("lat","lon","alt","speed","course","sats","hdop","vdop","pdop","timestamp")
+
+def _scale(x,k):
+    if x is None:
+        return 0
+    x = x*k
+    if x<0:
+        return int(x-0.5)
+    return int(x+0.5)
+
+def _put(buf,i,size,v):
+    if v is None:
+        v = 0
+    i*=size
+    for j in range(size):
+        buf[i+j] = v&0xff
+        v>>=8
+
+def _get(buf,i,size,signed):
+    i*=size
+    v = 0
+    for j in range(size-1,-1,-1):
+        v = (v<<8)|buf[i+j]
+    if signed and v&(1<<(8*size-1)):
+        v-=1<<(8*size)
+    return v
+
+# days before each month in a non leap year
+_MDAYS = (0,31,59,90,120,151,181,212,243,273,304,334)
+
+def _utc(secs):
+    # (yyyy,MM,dd,hh,mm,ss,0) of seconds since 2000-01-01 00:00:00
+    days = secs//86400
+    secs = secs%86400
+    y = 2000
+    while True:
+        n = 366 if y%4==0 else 365
+        if days<n:
+            break
+        days-=n
+        y+=1
+    m = 11
+    while _MDAYS[m]+(1 if m>1 and y%4==0 else 0)>days:
+        m-=1
+    days-=_MDAYS[m]+(1 if m>1 and y%4==0 else 0)
+    return (y,m+1,days+1,secs//3600,(secs//60)%60,secs%60,0)
+
+def _seconds(utc):
+    # seconds since 2000-01-01 00:00:00 of a (yyyy,MM,dd,hh,mm,ss,us) tuple
+    if utc is None:
+        return 0
+    y = utc[0]-2000
+    days = y*365+(y+3)//4+_MDAYS[utc[1]-1]+utc[2]-1
+    if utc[1]>2 and utc[0]%4==0:
+        days+=1
+    return ((days*24+utc[3])*60+utc[4])*60+utc[5]
+
+def _typekey(a,b,c):
+    return (a<<16)|(b<<8)|c
+
+_START_COMMANDS = (pmtk.HOT_START,pmtk.WARM_START,pmtk.COLD_START,pmtk.FULL_COLD_START)
+
+_RMC = _typekey(0x52,0x4d,0x43)
+_GGA = _typekey(0x47,0x47,0x41)
+_GSA = _typekey(0x47,0x53,0x41)
+
+def _decimal(rx,a,b,digits):
+    # "[-]iii.fff" in rx[a:b] as an integer scaled by 10**digits (extra digits are truncated), None if empty
+    if a>=b:
+        return None
+    neg = rx[a]==0x2d
+    if neg:
+        a+=1
+    v = 0
+    frac = -1
+    while a<b:
+        c = rx[a]
+        if c==0x2e:
+            frac = 0
+        elif frac<digits:
+            v = v*10+c-0x30
+            if frac>=0:
+                frac+=1
+        a+=1
+    if frac<0:
+        frac = 0
+    while frac<digits:
+        v*=10
+        frac+=1
+    return -v if neg else v
+
+def _coord(rx,a,b,negative):
+    # "[d]ddmm.mmmmm" to 1e-7 degrees
+    v = _decimal(rx,a,b,5)
+    if v is None:
+        return None
+    # v is ddmm.mmmmm*1e5: minutes*1e5*1e7/60e5 = minutes*1e5*5/3
+    v = (v//10000000)*10000000+((v%10000000)*5+1)//3
+    return -v if negative else v
+
+def _hhmmss(rx,a,b):
+    if b-a<6:
+        return None
+    return (
+        (rx[a]-0x30)*10+rx[a+1]-0x30,
+        (rx[a+2]-0x30)*10+rx[a+3]-0x30,
+        (rx[a+4]-0x30)*10+rx[a+5]-0x30,
+        _decimal(rx,a+6,b,6) if b>a+6 else 0
+    )
+
+def _ddmmyy(rx,a,b):
+    if b-a<6:
+        return None
+    return (
+        2000+(rx[a+4]-0x30)*10+rx[a+5]-0x30,
+        (rx[a+2]-0x30)*10+rx[a+3]-0x30,
+        (rx[a]-0x30)*10+rx[a+1]-0x30
+    )
+
+def _check_ack(flag):
+    # PMTK001 flag (-1 if not received) to exception
+    if flag==3:
+        return
+    if flag<0:
+        raise TimeoutError
+    if flag==0:
+        raise ValueError
+    if flag==1:
+        raise UnsupportedError
+    raise RuntimeError
+
+def _power_args(power):
+    # PMTK225 parameters of a (mode, run, sleep, second run, second sleep) tuple
+    if power[0]==POWER_PERIODIC:
+        return power
+    return (power[0],)
+
+def _fixed(v,digits):
+    # integer v scaled by 10**digits as a decimal string, without floats
+    k = 10**digits
+    sign = ""
+    if v<0:
+        sign = "-"
+        v = -v
+    frac = str(v%k)
+    return sign+str(v//k)+"."+"0"*(digits-len(frac))+frac
+
+def _real(v,k):
+    if v is None:
+        return None
+    return v/k
+
+def _hexval(c):
+    if c>=0x30 and c<=0x39:
+        return c-0x30
+    c|=0x20
+    if c>=0x61 and c<=0x66:
+        return c-0x57
+    return -1
@@ -0,0 +1,139 @@
+"""
+.. module:: pmtk
+
+***********
+PMTK Module
+***********
+
+This module builds the PMTK commands understood by the Quectel L76 and other MediaTek based GNSS chips.
+
+A command is given by its number and its parameters and is returned fully framed as bytes, ready to be written
+to the chip: ``$PMTK<num>,<params>*<checksum>\\r\\n``. Checksums are never hand-computed.
+
+The most recently built commands are kept in a small LRU cache, so that repeating a command (a rate change,
+a standby request...) costs a dictionary lookup instead of string building and checksum computation.
+Commands without parameters that are used by the driver are precomputed as module constants.
+
+Packets of the PMTK binary protocol (used to upload EPO assistance data) are built with :func:`binary` and :func:`seal`:
+``0x04 0x24 <length> <command> <payload> <checksum> 0x0d 0x0a``, with little endian 16 bits length and command.
+
+    """
+
+import threading
+
+# number of framed commands kept in the LRU cache
+CACHE_SIZE=8
+
+_HEX = b"0123456789ABCDEF"
+
+_cache = {}
+_order = []
+# commands are built by the application and by the L76 receiver thread
+_lock = threading.Lock()
+
+
+def frame(body):
+    """
+.. function:: frame(body)
+
+    Frame the string *body* (for example :samp:`"PMTK220,1000"`) as a complete NMEA command.
+
+    :returns: the command as bytes, including ``$``, checksum and line terminator.
+
+    """
+    n = len(body)
+    out = bytearray(n+6)
+    out[0] = 0x24
+    crc = 0
+    for i in range(n):
+        c = ord(body[i])
+        out[i+1] = c
+        crc^=c
+    out[n+1] = 0x2a
+    out[n+2] = _HEX[crc>>4]
+    out[n+3] = _HEX[crc&0x0f]
+    out[n+4] = 0x0d
+    out[n+5] = 0x0a
+    return bytes(out)
+
+
+def command(num,*args):
+    """
+.. function:: command(num, *args)
+
+    Return the framed PMTK command number *num* with parameters *args*.
+    For example :samp:`command(220,1000)` returns ``b"$PMTK220,1000*1F\\r\\n"``.
+
+    Results are cached: the last :samp:`CACHE_SIZE` distinct commands are returned without being rebuilt.
+    The cache can be used from several threads.
+
+    """
+    key = (num,args)
+    _lock.acquire()
+    try:
+        msg = _cache.get(key)
+        if msg is not None:
+            if _order[-1]!=key:
+                _order.remove(key)
+                _order.append(key)
+            return msg
+    finally:
+        _lock.release()
+    body = "PMTK"+str(num)
+    for a in args:
+        body+=","+str(a)
+    msg = frame(body)
+    _lock.acquire()
+    try:
+        if key not in _cache:
+            if len(_order)>=CACHE_SIZE:
+                del _cache[_order.pop(0)]
+            _cache[key] = msg
+            _order.append(key)
+    finally:
+        _lock.release()
+    return msg
+
+
+def binary(cmd,size):
+    """
+.. function:: binary(cmd, size)
+
+    Return a bytearray holding a binary packet for command *cmd* with room for *size* payload bytes, starting at offset 6.
+    Fill the payload, then call :func:`seal` before sending it. A packet can be refilled and sealed again.
+
+    """
+    n = size+9
+    pkt = bytearray(n)
+    pkt[0] = 0x04
+    pkt[1] = 0x24
+    pkt[2] = n&0xff
+    pkt[3] = n>>8
+    pkt[4] = cmd&0xff
+    pkt[5] = cmd>>8
+    pkt[n-2] = 0x0d
+    pkt[n-1] = 0x0a
+    return pkt
+
+
+def seal(pkt):
+    """
+.. function:: seal(pkt)
+
+    Compute the checksum of the binary packet *pkt* (from :func:`binary`) in place and return it.
+
+    """
+    crc = 0
+    n = len(pkt)
+    for i in range(2,n-3):
+        crc^=pkt[i]
+    pkt[n-3] = crc
+    return pkt
+
+
+# precomputed commands
+HOT_START = frame("PMTK101")
+WARM_START = frame("PMTK102")
+COLD_START = frame("PMTK103")
+FULL_COLD_START = frame("PMTK104")
+STANDBY = frame("PMTK161,0")
@@ -0,0 +1,251 @@
+"""
+.. module:: transport
+
+****************
+Transport Module
+****************
+
+This module implements the links between the L76 driver and the chip. A transport is created once and owned by
+an :class:`L76 <l76.L76>` instance, which opens it once in its constructor and keeps it open from then on.
+
+Every transport has the same methods:
+
+    * :samp:`open()` and :samp:`close()`
+    * :samp:`write(data)`: send a command to the chip
+    * :samp:`readinto(buf)`: read at most :samp:`len(buf)` bytes into *buf* and return how many (blocking serial ports return at least one)
+    * :samp:`available()`: number of bytes that can be read without waiting, as a hint for the size of the next read
+    * :samp:`set_baud(baud)`: change the local baudrate, reopening the link if open (serial only)
+
+:samp:`baud` is the current baudrate, *None* for links without one. :samp:`duplex` is *True* if writes can happen
+while another thread is blocked in a read; on other links the L76 receiver thread writes the commands itself, between reads.
+
+Available transports:
+
+    * :class:`SerialTransport`: UART, through :samp:`streams.serial`
+    * :class:`I2CTransport`: DDC interface over I2C
+    * :class:`MemoryTransport`: bytes fed by the application, for tests and host tools
+
+Any object with the same methods can be passed to :class:`L76 <l76.L76>` as *transport*.
+
+    """
+
+import streams
+import i2c
+
+# DDC (I2C) interface: default address, bytes per read burst, pause between bursts,
+# pause when no data is ready and after a write (milliseconds)
+DDC_ADDR=0x10
+DDC_BURST=255
+DDC_WAIT=2
+DDC_IDLE=20
+DDC_WRITE_WAIT=10
+
+# pause of MemoryTransport reads when no data is pending (milliseconds)
+MEMORY_IDLE=10
+
+_FILLER = b"\x0a"*DDC_BURST
+
+
+class Transport():
+    """
+.. class:: Transport()
+
+    Base class of the transports: every method raises *UnsupportedError*.
+
+    """
+    baud = None
+    duplex = True
+
+    def open(self):
+        raise UnsupportedError
+
+    def close(self):
+        raise UnsupportedError
+
+    def write(self,data):
+        raise UnsupportedError
+
+    def readinto(self,buf):
+        raise UnsupportedError
+
+    def available(self):
+        raise UnsupportedError
+
+    def set_baud(self,baud):
+        raise UnsupportedError
+
+
+class SerialTransport(Transport):
+    """
+.. class:: SerialTransport(ifc, baud=9600)
+
+    Serial port *ifc* (for example :samp:`SERIAL1`) at *baud*.
+
+    """
+
+    def __init__(self,ifc,baud=9600):
+        self.ifc = ifc
+        self.baud = baud
+        self.port = None
+
+    def open(self):
+        self.port = streams.serial(self.ifc,baud=self.baud,set_default=False)
+
+    def close(self):
+        if self.port is not None:
+            self.port.close()
+            self.port = None
+
+    def write(self,data):
+        return self.port.write(data)
+
+    def readinto(self,buf):
+        return self.port.readinto(buf)
+
+    def available(self):
+        return self.port.available()
+
+    def set_baud(self,baud):
+        self.baud = baud
+        if self.port is not None:
+            self.close()
+            self.open()
+
+
+class I2CTransport(Transport):
+    """
+.. class:: I2CTransport(ifc, addr=DDC_ADDR, clock=400000)
+
+    DDC interface of the L76 on I2C bus *ifc* (for example :samp:`I2C0`). Reads and writes are bus transactions: the link is not :samp:`duplex`.
+
+    The chip output buffer is read in bursts of :samp:`DDC_BURST` bytes, padded with 0x0a filler bytes when the buffer runs empty:
+    a burst made of filler only is recognized with a single comparison and followed by a pause of :samp:`DDC_IDLE` milliseconds,
+    filler after the last sentence of a burst is trimmed. :samp:`readinto` never blocks and returns 0 when no data is ready.
+
+    """
+    duplex = False
+
+    def __init__(self,ifc,addr=DDC_ADDR,clock=400000):
+        self.ifc = ifc
+        self.addr = addr
+        self.clock = clock
+        self.port = None
+        self._burst = b""
+        self._pos = 0
+        self._end = 0
+
+    def open(self):
+        self.port = i2c.I2C(self.ifc,self.addr,self.clock)
+        self.port.start()
+        self._pos = 0
+        self._end = 0
+
+    def close(self):
+        if self.port is not None:
+            self.port.stop()
+            self.port = None
+
+    def available(self):
+        left = self._end-self._pos
+        return left if left>0 else DDC_BURST
+
+    def readinto(self,buf):
+        if self._pos>=self._end and not self._fetch():
+            return 0
+        n = self._end-self._pos
+        if n>len(buf):
+            n = len(buf)
+        buf[0:n] = self._burst[self._pos:self._pos+n]
+        self._pos+=n
+        return n
+
+    def write(self,data):
+        self.port.write(data)
+        sleep(DDC_WRITE_WAIT)
+        return len(data)
+
+    def _fetch(self):
+        data = self.port.read(DDC_BURST)
+        if data==_FILLER:
+            # nothing ready
+            sleep(DDC_IDLE)
+            return False
+        sleep(DDC_WAIT)
+        end = len(data)
+        k = data.rfind(b"\r\n")
+        if k>=0 and k+2<end and data[k+2]==0x0a and data.find(b"$",k+2)<0:
+            # filler after the last complete sentence
+            end = k+2
+        else:
+            # partial sentence: drop the filler after it, if any
+            while end>0 and data[end-1]==0x0a and (end<2 or data[end-2]!=0x0d):
+                end-=1
+            if end==0:
+                sleep(DDC_IDLE)
+                return False
+        self._burst = data
+        self._pos = 0
+        self._end = end
+        return end>0
+
+
+class MemoryTransport(Transport):
+    """
+.. class:: MemoryTransport(data=b"", chunk=0, on_write=None)
+
+    In-memory link: reads return the bytes passed as *data* or later with :meth:`feed`, at most *chunk* bytes per read
+    if *chunk* is greater than zero. When no data is pending, :samp:`readinto` waits :samp:`MEMORY_IDLE` milliseconds and returns 0.
+
+    Written bytes are appended to :samp:`written`; *on_write*, if given, is called with each write
+    (for example to :meth:`feed` back a PMTK001 acknowledge).
+
+    """
+
+    def __init__(self,data=b"",chunk=0,on_write=None):
+        self.data = bytearray(data)
+        self.pos = 0
+        self.chunk = chunk
+        self.on_write = on_write
+        self.written = bytearray()
+        self.opened = False
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+    def feed(self,data):
+        """
+.. method:: feed(data)
+
+        Append *data* to the bytes returned by reads.
+
+        """
+        if self.pos>0:
+            del self.data[0:self.pos]
+            self.pos = 0
+        self.data.extend(data)
+
+    def available(self):
+        n = len(self.data)-self.pos
+        if self.chunk>0 and n>self.chunk:
+            return self.chunk
+        return n
+
+    def readinto(self,buf):
+        n = self.available()
+        if n<=0:
+            sleep(MEMORY_IDLE)
+            return 0
+        if n>len(buf):
+            n = len(buf)
+        buf[0:n] = self.data[self.pos:self.pos+n]
+        self.pos+=n
+        return n
+
+    def write(self,data):
+        self.written.extend(data)
+        if self.on_write is not None:
+            self.on_write(data)
+        return len(data)